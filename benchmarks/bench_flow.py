@@ -0,0 +1,153 @@
+"""
+Offline end-to-end benchmark for RealEstateFlow.
+
+Seeds synthetic listings into mongomock (or a local mongod with --mongo-uri),
+replaces OpenAI and the CrewAI property agent with scripted fakes of
+configurable latency, replays multi-turn conversations and reports p50/p95
+per tracing span (see `src/bahria/tracing.py`), bytes moved, prompt tokens
+(and how many a provider prompt cache would serve) and peak RSS.
+
+Run from the repository root:
+    python benchmarks/bench_flow.py --listings 2000 --conversations 5
+    python benchmarks/bench_flow.py --rounds 10   # long sessions
+    python benchmarks/bench_flow.py --mongo-uri mongodb://localhost:27017 --json bench_output.txt
+"""
+import os, sys, json, argparse, resource, statistics
+from collections import defaultdict
+from typing import List, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src", "bahria"))
+sys.path.insert(0, BENCH_DIR)
+
+CONVERSATIONS: List[List[str]] = [
+    ["hi, sam here", "I want a home in Bahria Town Lahore", "show more", "what about 5 marla plots?", "thanks"],
+    ["salam", "show me apartments for rent in DHA Karachi", "search again that DHA Karachi query"],
+    ["looking for commercial plots in Gulberg Islamabad under 5 crore", "and in Askari Rawalpindi?"],
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class SpanCollector:
+    """
+    Tracer exporter that keeps span durations (seconds) per span name.
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.bytes_moved = 0
+
+    def __call__(self, record: Dict):
+        self.durations[record["name"]].append(record["duration_ms"] / 1000)
+        if record["name"] == "mongo.query":
+            self.bytes_moved += record["attrs"].get("bytes", 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark RealEstateFlow offline.")
+    parser.add_argument("--listings", type=int, default=500, help="Synthetic listings per property collection.")
+    parser.add_argument("--conversations", type=int, default=3, help="Conversations to replay (scripts are cycled).")
+    parser.add_argument("--rounds", type=int, default=1, help="Times each script is repeated within its conversation, for long sessions.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM seconds per call.")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0005, help="Fake LLM seconds per generated token.")
+    parser.add_argument("--summary-tokens", type=int, default=120, help="Fake summary tokens generated per listing.")
+    parser.add_argument("--agent-latency", type=float, default=0.5, help="Fake agent seconds per reasoning step.")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="Simulated mongomock server seconds per collection scanned.")
+    parser.add_argument("--stream", action="store_true", help="Run turns in streaming mode.")
+    parser.add_argument("--mongo-uri", help="Use a local mongod instead of mongomock.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_MODEL": "benchmark-model",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "CREWAI_TRACING_ENABLED": "false",
+        "DB_NAME": "bahria_benchmark",
+        "MONGODB_URI": args.mongo_uri or "mongodb://localhost:27017",
+        "CHAT_TRANSCRIPT_PATH": os.path.join(BENCH_DIR, ".bench_chat_history.jsonl"),
+    })
+
+    import fakes
+    if not args.mongo_uri:
+        import mongomock, pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+        fakes.enable_union_with(args.mongo_latency)
+
+    import crew
+    from tools.mongo_client import get_db
+    from tracing import tracer
+    from synthetic import seed
+
+    fakes.FakeOpenAI.completions = fakes.FakeCompletions(args.llm_latency, args.llm_token_latency, args.summary_tokens)
+    crew.OpenAI = fakes.FakeOpenAI
+
+    counts = seed(get_db(), args.listings, args.seed)
+
+    collector = SpanCollector()
+    tracer.add_exporter(collector)
+
+    for index in range(args.conversations):
+        flow = crew.RealEstateFlow(session_id=f"bench-{index}")
+        flow.property_agent = fakes.FakeAgent(flow.mongo_tool, args.agent_latency)
+        for user_input in CONVERSATIONS[index % len(CONVERSATIONS)] * args.rounds:
+            response = flow.kickoff(inputs={"user_input": user_input, "prompt": "", "stream": args.stream})
+            if not isinstance(response, str):
+                response = "".join(response)
+
+    calls = fakes.FakeOpenAI.completions.calls
+    stages = dict(sorted(collector.durations.items()))
+    report = {
+        "listings": counts,
+        "stages": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+            }
+            for name, values in stages.items()
+        },
+        "bytes_moved": collector.bytes_moved,
+        "llm_calls": len(calls),
+        "prompt_tokens": {
+            "total": sum(c["prompt_tokens"] for c in calls),
+            "p50": percentile([c["prompt_tokens"] for c in calls], 50),
+            "max": max((c["prompt_tokens"] for c in calls), default=0),
+        },
+        "cached_tokens": sum(c.get("cached_tokens", 0) for c in calls),
+        "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    prompt_total = report["prompt_tokens"]["total"]
+    report["cached_token_rate"] = round(report["cached_tokens"] / prompt_total, 3) if prompt_total else 0.0
+
+    print(f"{'stage':<16}{'count':>7}{'p50 ms':>12}{'p95 ms':>12}")
+    for name, row in report["stages"].items():
+        print(f"{name:<16}{row['count']:>7}{row['p50_ms']:>12}{row['p95_ms']:>12}")
+    print(f"bytes moved: {report['bytes_moved']}  llm calls: {report['llm_calls']}  "
+          f"prompt tokens: {report['prompt_tokens']['total']} (max {report['prompt_tokens']['max']})  "
+          f"peak RSS: {report['peak_rss_mb']} MB")
+    print(f"cached prompt tokens: {report['cached_tokens']} ({report['cached_token_rate']:.1%})  "
+          f"quick replies: {report['stages'].get('quick_reply', {}).get('count', 0)}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
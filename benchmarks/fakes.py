@@ -0,0 +1,202 @@
+"""
+Deterministic stand-ins for OpenAI and the CrewAI property agent, plus
+`$unionWith` support for mongomock, so the flow can be benchmarked offline.
+"""
+import json, time, types, hashlib
+from typing import List, Dict
+
+from tools.query_compiler import extract_query_spec, compile_pipeline, PROPERTY_COLLECTIONS
+from context_window import count_tokens
+
+
+# ------------------------------
+# Fake OpenAI
+# ------------------------------
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content):
+        self.message = _Message(content)
+        self.delta = _Message(content)
+
+
+class _Response:
+    def __init__(self, content, usage=None):
+        self.choices = [_Choice(content)]
+        self.usage = usage
+
+
+class FakeCompletions:
+    """
+    Scripted `chat.completions`: returns the search JSON when the latest
+    user message names a city and society, a summary for summarization
+    prompts, an intro and follow-up for rendered results, and a greeting
+    otherwise. Sleeps `latency` seconds per call plus
+    `token_latency` per generated token, and records prompt sizes.
+
+    Provider prompt caching is simulated per message boundary: the longest
+    run of leading messages already sent in an earlier call counts as
+    cached once it reaches `cache_min_tokens`, in `cache_increment` steps.
+    """
+    cache_min_tokens = 1024
+    cache_increment = 128
+
+    def __init__(self, latency: float, token_latency: float, summary_tokens_per_listing: int):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.summary_tokens_per_listing = summary_tokens_per_listing
+        self.calls: List[Dict] = []
+        self._sr_number = 0
+        self._prefixes = set()
+
+    def _reply(self, messages: List[Dict]) -> str:
+        last = messages[-1]["content"]
+        if "Reply with exactly two lines" in last:
+            return "We have found following properties matching your criteria.\nCould you please tell me more about the property you are interested in?"
+        if last.startswith("For this property_query") or last.startswith("Here are the full results"):
+            listings = last.count('"property_type"')
+            return "We have found following properties matching your criteria. " + "listing details " * (self.summary_tokens_per_listing // 2) * max(listings, 1)
+        if extract_query_spec(last):
+            self._sr_number += 1
+            return json.dumps({"sr_number": self._sr_number, "property_details": f"looking for property in {last}"})
+        return "Hello! Which city and society are you interested in?"
+
+    def _cached_tokens(self, messages: List[Dict]) -> int:
+        digest = hashlib.sha256()
+        tokens = cached = 0
+        for message in messages:
+            digest.update(json.dumps([message["role"], message["content"]]).encode("utf-8"))
+            tokens += count_tokens(message["content"])
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                cached = tokens
+            self._prefixes.add(key)
+        if cached < self.cache_min_tokens:
+            return 0
+        return cached - cached % self.cache_increment
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        cached_tokens = self._cached_tokens(messages)
+        reply = self._reply(messages)
+        completion_tokens = count_tokens(reply)
+        self.calls.append({"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "completion_tokens": completion_tokens})
+        usage = types.SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            prompt_tokens_details=types.SimpleNamespace(cached_tokens=cached_tokens),
+        )
+
+        time.sleep(self.latency)
+        if not stream:
+            time.sleep(self.token_latency * completion_tokens)
+            return _Response(reply, usage)
+
+        def _chunks():
+            words = reply.split(" ")
+            for index, word in enumerate(words):
+                time.sleep(self.token_latency)
+                yield _Response(word if index == len(words) - 1 else word + " ")
+        return _chunks()
+
+
+class FakeOpenAI:
+    """
+    Drop-in for `openai.OpenAI` sharing one FakeCompletions across instances.
+    """
+    completions: FakeCompletions = None
+
+    def __init__(self, **kwargs):
+        self.chat = types.SimpleNamespace(completions=FakeOpenAI.completions)
+
+
+# ------------------------------
+# Fake Property Agent
+# ------------------------------
+class FakeAgent:
+    """
+    Stands in for the CrewAI property agent: waits `latency` seconds per
+    simulated LLM step, then runs the pipeline the agent would have written.
+    """
+
+    def __init__(self, mongo_tool, latency: float, steps: int = 2):
+        self.mongo_tool = mongo_tool
+        self.latency = latency
+        self.steps = steps
+
+    def execute_task(self, task, context=None):
+        time.sleep(self.latency * self.steps)
+        pipeline = compile_pipeline(context or "")
+        if not pipeline:
+            return "I'm sorry, I couldn't find properties matching your criteria. Could you please broaden your search parameters?"
+        return self.mongo_tool._run(pipeline=pipeline, collection_hint=PROPERTY_COLLECTIONS[0])
+
+
+# ------------------------------
+# mongomock $unionWith
+# ------------------------------
+def enable_union_with(latency: float = 0.0):
+    """
+    Teach mongomock's `aggregate` the `$unionWith` stage: stages before the
+    first union run on the base collection, each union's sub-pipeline runs on
+    its own collection, and the remaining stages run over the combined docs.
+    `latency` adds simulated server time per collection scanned, so a union
+    costs the sum over its collections, as it does on a real server.
+    `$unset`, which mongomock lacks too, runs as the equivalent exclusion
+    `$project`.
+    """
+    import mongomock
+    from mongomock.command_cursor import CommandCursor
+
+    patched = mongomock.collection.Collection.aggregate
+    if getattr(patched, "_supports_union_with", False):
+        patched.latency = latency
+        return
+
+    def original(self, pipeline, session=None, **kwargs):
+        stages = [
+            {"$project": {field: 0 for field in ([stage["$unset"]] if isinstance(stage["$unset"], str) else stage["$unset"])}}
+            if "$unset" in stage else stage
+            for stage in pipeline
+        ]
+        return patched(self, stages, session=session, **kwargs)
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        if aggregate.latency and self.name != "__union_with_scratch":
+            time.sleep(aggregate.latency)
+        index = next((i for i, stage in enumerate(pipeline) if "$unionWith" in stage), None)
+        if index is None:
+            return original(self, pipeline, session=session, **kwargs)
+
+        docs = list(original(self, pipeline[:index], session=session))
+        while index < len(pipeline) and "$unionWith" in pipeline[index]:
+            union = pipeline[index]["$unionWith"]
+            coll, sub = (union, []) if isinstance(union, str) else (union["coll"], union.get("pipeline", []))
+            docs.extend(aggregate(self.database[coll], sub, session=session))
+            index += 1
+
+        tail = pipeline[index:]
+        if tail:
+            scratch = self.database["__union_with_scratch"]
+            scratch.drop()
+            generated = set()
+            if docs:
+                # Documents keep their own _id, so keyset stages on _id see
+                # the real values; ids the scratch collection makes up for
+                # documents without one are removed again below
+                missing = ["_id" not in doc for doc in docs]
+                inserted = scratch.insert_many(docs).inserted_ids
+                generated = {oid for oid, made_up in zip(inserted, missing) if made_up}
+            docs = [
+                {k: v for k, v in doc.items() if not (k == "_id" and v in generated)}
+                for doc in original(scratch, tail, session=session)
+            ]
+            scratch.drop()
+        return CommandCursor(docs)
+
+    aggregate._supports_union_with = True
+    aggregate.latency = latency
+    mongomock.collection.Collection.aggregate = aggregate
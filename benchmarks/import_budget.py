@@ -0,0 +1,91 @@
+"""
+Import-time budget for the app's cold start.
+
+Imports each module in a fresh interpreter with `-X importtime`, reports the
+cumulative time and the slowest top-level imports, and exits non-zero when a
+module is over its budget. The defaults leave headroom over crewai itself,
+which dominates startup; tighten them as imports are trimmed.
+
+Run from the repository root:
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget crew=6000 --top 15
+"""
+import os, sys, json, argparse, subprocess
+from typing import List, Dict, Tuple
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "bahria")
+
+# Cumulative import time budgets, in milliseconds
+DEFAULT_BUDGETS_MS = {
+    "tools.query_compiler": 50,
+    "session": 1500,
+    "tools.mongo_tool": 6000,
+    "crew": 7000,
+}
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Return (total_ms, [(imported_module, cumulative_ms), ...]) for one import.
+    """
+    env = dict(os.environ, CREWAI_DISABLE_TELEMETRY="true", CREWAI_TRACING_ENABLED="false")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        rows.append((name.rstrip(), int(cumulative) / 1000))
+    # The module is the last top-level row; its subtree is everything after
+    # the previous top-level row (interpreter startup imports come first).
+    end = max((i for i, (name, _) in enumerate(rows) if name.strip() == module), default=None)
+    if end is None:
+        return 0.0, []
+    start = max((i for i, (name, _) in enumerate(rows[:end]) if not name.startswith("  ")), default=-1) + 1
+    # Direct dependencies are indented one level below the module itself
+    top = [(name.strip(), ms) for name, ms in rows[start:end] if name.startswith("   ") and not name.startswith("     ")]
+    return rows[end][1], sorted(top, key=lambda row: row[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold-start import times against a budget.")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS", help="Override or add a budget.")
+    parser.add_argument("--top", type=int, default=8, help="Slowest direct imports to show per module.")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path.")
+    args = parser.parse_args(argv)
+
+    budgets: Dict[str, float] = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition("=")
+        budgets[module] = float(ms)
+
+    report = {}
+    over = []
+    for module, budget in budgets.items():
+        total, top = measure(module)
+        report[module] = {"ms": round(total, 1), "budget_ms": budget, "top": [{"module": m, "ms": round(ms, 1)} for m, ms in top[:args.top]]}
+        status = "ok" if total <= budget else "OVER"
+        if total > budget:
+            over.append(module)
+        print(f"{module:<24}{total:>10.1f} ms  (budget {budget:.0f} ms)  {status}")
+        for name, ms in top[:args.top]:
+            print(f"    {name:<36}{ms:>10.1f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if over:
+        raise SystemExit(f"Over import budget: {', '.join(over)}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Synthetic listings shaped like the schemas in `src/bahria/prompt.txt`.
+"""
+import random
+from typing import List, Dict
+
+CITIES = ["Lahore", "Karachi", "Rawalpindi", "Islamabad"]
+SOCIETIES = ["Bahria Town", "DHA", "Gulberg", "Askari"]
+
+PROPERTY_TYPES = {
+    "apartments": "Apartment",
+    "homes": "Home",
+    "shops": "Shop",
+    "commercial_plots": "Commercial Plot",
+    "farmhouses": "Farmhouse",
+    "residential_plots": "Residential Plot",
+    "plazas": "Plaza",
+}
+
+_PLOT_COLLECTIONS = {"commercial_plots", "farmhouses", "residential_plots"}
+
+
+def make_listing(rng: random.Random, collection: str) -> Dict:
+    size_unit = rng.choice(["Marla", "Kanal", "Sq. Ft"])
+    doc = {
+        "city": rng.choice(CITIES),
+        "society": rng.choice(SOCIETIES),
+        "property_type": PROPERTY_TYPES[collection],
+        "list_type": rng.choice(["Sale", "Rent"]),
+        "size": {"value": rng.choice([3, 5, 7, 10, 20]) if size_unit != "Sq. Ft" else rng.randint(400, 4000), "unit": size_unit},
+        "price": rng.randrange(1_000_000, 90_000_000, 50_000),
+        "payment_type": rng.choice(["Cash", "Installment"]),
+        "installment": rng.choice(["", "36 months", "60 months"]),
+        "phase": f"Phase {rng.randint(1, 8)}",
+        "pin_location": f"https://maps.app.goo.gl/{rng.getrandbits(48):012x}",
+        "full_Name": rng.choice(["Ali Khan", "Sara Ahmed", "Usman Tariq", "Ayesha Malik"]),
+        "office_Name": rng.choice(["Shan Developers", "Star Estate", ""]),
+        "email": f"agent{rng.randint(1, 500)}@example.com",
+        "contact_Number": f"+92300{rng.randint(1000000, 9999999)}",
+        "possession": rng.choice(["Yes", "No"]),
+        # Bulky fields the summaries never use
+        "images": [f"https://cdn.example.com/listings/{rng.getrandbits(64):016x}.jpg" for _ in range(rng.randint(3, 10))],
+        "video_url": f"https://video.example.com/{rng.getrandbits(64):016x}",
+    }
+    if collection in ("apartments", "homes"):
+        doc.update({
+            "bedrooms": rng.randint(1, 6),
+            "bathrooms": rng.randint(1, 5),
+            "furnished": rng.choice(["Yes", "No"]),
+            "kitchen": rng.randint(1, 2),
+        })
+    if collection in ("apartments", "shops", "plazas"):
+        doc.update({
+            "building_name": rng.choice(["High Q Tower", "Civic Center", "Mall of Bahria"]),
+            "commercialName": rng.choice(["Star Commercial", "Spring North", ""]),
+        })
+    if collection in ("homes", "farmhouses", "residential_plots"):
+        doc["sector"] = rng.choice(["A", "B", "C", "Orchard Farm", None])
+    if collection in _PLOT_COLLECTIONS:
+        doc.update({
+            "ownership": rng.choice(["Open", "Transferable"]),
+            "earth_status": rng.choice(["Develop", "Undevelop"]),
+            "extra_land": {"value": rng.choice([0, 1, 2]), "unit": "Marla"},
+            "note_for_result": "",
+            "allotment": {
+                "status": rng.choice(["balloted", "unballoted"]),
+                "details": {
+                    "plot": f"{rng.randint(1, 999):03d}",
+                    "street": f"{rng.randint(1, 40):02d}",
+                    "category": rng.choice(["Corner", "Park Facing", "General"]),
+                    "road_width": rng.choice([30, 40, 60]),
+                    "map_charges": rng.choice(["Paid", "Unpaid"]),
+                    "development_charges": rng.choice(["Paid", "Unpaid"]),
+                    "possessionUitilityCharges": rng.choice(["Paid", "Unpaid"]),
+                },
+            },
+        })
+    return doc
+
+
+def seed(database, per_collection: int, random_seed: int = 7) -> Dict[str, int]:
+    """
+    Replace every property collection with `per_collection` synthetic listings.
+    """
+    rng = random.Random(random_seed)
+    counts = {}
+    for collection in PROPERTY_TYPES:
+        database[collection].drop()
+        docs: List[Dict] = [make_listing(rng, collection) for _ in range(per_collection)]
+        if docs:
+            database[collection].insert_many(docs)
+        counts[collection] = len(docs)
+    return counts
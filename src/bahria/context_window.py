@@ -0,0 +1,115 @@
+import json
+from functools import lru_cache
+from typing import Optional, List, Dict
+
+
+SUMMARY_HEADER = "### Earlier Conversation (compacted)"
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # Not installed, or the BPE file can't be downloaded
+        print(f"[Info] tiktoken unavailable, estimating tokens from length: {str(e)}")
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """
+    Token count with tiktoken when it can be loaded, else ~4 characters per token.
+    """
+    enc = _encoding(encoding)
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+class ConversationWindow:
+    """
+    Keeps a conversation (Chat.messages) within `max_tokens`, counted locally.
+    Once over budget, the oldest turns are folded into a single summary
+    message at the front until the conversation is back under
+    `target_tokens`, always keeping the last `keep_recent` messages verbatim.
+    Compacting well below the budget means it happens every few turns rather
+    than every turn, so the prompt prefix stays cacheable in between.
+
+    The summary is built locally, without a model call: one short line per
+    folded message, with the search JSON replies (sr_number and
+    property_details, which carry the city and society needed for re-runs)
+    kept verbatim and dropped last when the summary itself is over
+    `summary_max_tokens`.
+    """
+
+    def __init__(self, max_tokens: int = 8000, target_tokens: Optional[int] = None, keep_recent: int = 2, summary_max_tokens: Optional[int] = None, line_chars: int = 160):
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens if target_tokens is not None else max_tokens * 3 // 5
+        self.keep_recent = keep_recent
+        self.summary_max_tokens = summary_max_tokens if summary_max_tokens is not None else max_tokens // 5
+        self.line_chars = line_chars
+
+    @staticmethod
+    def tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(count_tokens(message["content"] or "") + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    @staticmethod
+    def is_summary(message: Dict[str, str]) -> bool:
+        return message["role"] == "system" and (message["content"] or "").startswith(SUMMARY_HEADER)
+
+    def compact(self, messages: List[Dict[str, str]]) -> Optional[Dict]:
+        """
+        Compact `messages` in place if they are over budget. Returns the
+        token counts before and after, or None if nothing was done.
+        """
+        before = self.tokens(messages)
+        if before <= self.max_tokens:
+            return None
+
+        has_summary = bool(messages) and self.is_summary(messages[0])
+        lines = messages[0]["content"].split("\n")[1:] if has_summary else []
+        start = 1 if has_summary else 0
+        total = before
+        end = start
+        # Fold whole turns: stop only in front of a user message
+        while len(messages) - end > self.keep_recent and (total > self.target_tokens or messages[end]["role"] != "user"):
+            total -= self.tokens([messages[end]])
+            lines.append(self._line(messages[end]))
+            end += 1
+        if end == start:
+            return None
+
+        summary = {"role": "system", "content": self._summary(lines)}
+        messages[:end] = [summary]
+        return {"tokens_before": before, "tokens_after": self.tokens(messages), "folded": end - start}
+
+    def _line(self, message: Dict[str, str]) -> str:
+        content = message["content"] or ""
+        if message["role"] == "assistant":
+            try:
+                analysis = json.loads(content)
+            except json.JSONDecodeError:
+                analysis = None
+            if isinstance(analysis, dict) and "property_details" in analysis:
+                fact = {key: analysis[key] for key in ("sr_number", "property_details") if key in analysis}
+                return "- search: " + json.dumps(fact, ensure_ascii=False)
+        return f"- {message['role']}: {_shorten(content, self.line_chars)}"
+
+    def _summary(self, lines: List[str]) -> str:
+        lines = [line for line in lines if line]
+        # Drop the oldest lines, search facts last, until the summary fits
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_max_tokens:
+            index = next((i for i, line in enumerate(lines) if not line.startswith("- search: ")), 0)
+            del lines[index]
+        return "\n".join([SUMMARY_HEADER] + lines)
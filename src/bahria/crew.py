@@ -3,12 +3,26 @@ from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List, Optional, Dict
 from crewai.flow.flow import Flow, listen, start, router
-import json, os, yaml, re
-from tools.mongo_tool import MongoTool
+import json, os, yaml, re, uuid, time, copy
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from tools.mongo_tool import MongoTool, NO_DATA_MESSAGE
+from tools.query_guard import QueryRejected
+from tools.query_compiler import compile_pipeline, PROPERTY_COLLECTIONS
+from tools.listing_filter import extract_filters, filter_listings, compile_predicate, closest_listings
+from tools.payload import compact_dumps
+from summaries import render_listings, split_intro, DEFAULT_INTRO, DEFAULT_FOLLOW_UP, SHOW_MORE_HINT, NO_MORE_RESULTS
+from summaries import NO_MATCH_REPLY, ALTERNATIVES_HEADER, ADJUST_FILTERS, NO_ALTERNATIVES, SEARCH_TOO_BROAD
+from quick_replies import classify, wants_more, wants_alternatives
+from context_window import ConversationWindow
+from bson import json_util
+from session import SessionState, sessions
+from transcript import transcript
+from tracing import tracer
 from dotenv import load_dotenv
 from pydantic import BaseModel
-import streamlit as st
-import google.generativeai as genai
+# crewai already imports openai, so this costs nothing extra at startup
 from openai import OpenAI
 
 
@@ -27,84 +41,239 @@ load_dotenv()
 if os.getenv("CREWAI_DISABLE_TELEMETRY") != "true":
     print("Warning: CREWAI_DISABLE_TELEMETRY is not set to 'true'. Set this environment variable to disable telemetry and avoid connection errors.")
 
+# Drop fetched listings that contradict explicit constraints in property_details
+# (type, size, purpose, bedrooms, phase, price) before they are summarized
+LOCAL_FILTERING = os.getenv("LOCAL_FILTERING", "true").lower() == "true"
 
-property_details: str = ""
-agent_output: str = ""
-sr_number: int = 1
-agent_history: List[Dict] = []
-total_properties: int = 0
+# When no listing meets every constraint, this many of the closest ones are
+# kept, and shown under a "closest alternatives" header if the user asks
+MAX_ALTERNATIVES = int(os.getenv("MAX_ALTERNATIVES", "5"))
+
+# Render listing summaries from the documents (summaries.py); the model only
+# writes the intro and follow-up question. Set to false to have the model
+# write every summary as before.
+RENDER_SUMMARIES = os.getenv("RENDER_SUMMARIES", "true").lower() == "true"
+
+# Listings per page of a compiled search; "show more" continues from the last
+# one shown (0 fetches every result at once)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+
+# With RENDER_SUMMARIES=false, results larger than this are summarized in
+# chunks of this many listings by parallel model calls (0 disables). Half a
+# page by default, so a full page is split in two
+SUMMARY_CHUNK_SIZE = int(os.getenv("SUMMARY_CHUNK_SIZE", str(max(1, SEARCH_PAGE_SIZE // 2) if SEARCH_PAGE_SIZE else 10)))
+
+# Answer greetings, thanks, goodbyes, off-topic and harmful turns with the
+# canned replies from quick_replies.py instead of a model call
+QUICK_REPLIES = os.getenv("QUICK_REPLIES", "true").lower() == "true"
+
+# Token budget for the stored conversation (excluding the system prompt and
+# session state); older turns are compacted once it is exceeded
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "8000"))
+CHAT_KEEP_RECENT = int(os.getenv("CHAT_KEEP_RECENT", "2"))
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+
+
+@lru_cache(maxsize=None)
+def load_config(file_name: str) -> Dict:
+    """
+    Parse a YAML file from `config/` once per process. Callers must not
+    mutate the result; copy it first.
+    """
+    with open(os.path.join(CONFIG_DIR, file_name), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+@lru_cache(maxsize=1)
+def system_prompt() -> str:
+    """
+    The static instructions from tasks.yaml. They are byte-identical for every
+    session and turn, so they form a prefix the provider can cache; the
+    volatile session state is sent after the conversation (see
+    `Chat.state_message`).
+    """
+    # Replace literal "\n" with actual newlines and unescape the {{ }} braces
+    return load_config("tasks.yaml")['analyze_query_task']['description'].replace('\\n', '\n').format()
+
+
+@lru_cache(maxsize=1)
+def openai_client() -> OpenAI:
+    # One client per process so every session reuses its HTTP connection pool
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@lru_cache(maxsize=1)
+def summary_executor() -> ThreadPoolExecutor:
+    # Shared by every session, so SUMMARY_WORKERS caps concurrent chunk calls
+    return ThreadPoolExecutor(max_workers=int(os.getenv("SUMMARY_WORKERS", "4")), thread_name_prefix="summarize")
+
+
+def build_property_agent(agents_config: Dict) -> Agent:
+    return Agent(
+        config=agents_config.get('property_agent', {}),
+        llm = os.getenv("OPENAI_MODEL"),
+        tools=[MongoTool(result_as_answer=True)],
+        verbose= True
+    )
 
 
 class Chat:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, session: SessionState):
+        self.client = openai_client()
         self.model = os.getenv("OPENAI_MODEL")
-        self.messages: List[Dict[str, str]] = []
-        self._load_system_prompt()
-        
-    def _load_system_prompt(self):
-        # Load tasks.yaml
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        tasks_path = os.path.join(base_dir, "config", "tasks.yaml")
-        with open(tasks_path, "r", encoding="utf-8") as f:
-            tasks_config = yaml.safe_load(f)
-        # Get description and clean it
-        raw_description = tasks_config['analyze_query_task']['description']
-        # Replace literal "\n" with actual newlines
-        cleaned_description = raw_description.replace('\\n', '\n')
-        # Format with agent_history and sr_number
-        system_prompt = cleaned_description.format(agent_history=json.dumps(agent_history, indent=2), sr_number=sr_number, total_properties=total_properties)
-        # Update or set system prompt as the first message
-        if self.messages and self.messages[0]["role"] == "system":
-            self.messages[0]["content"] = system_prompt
-        else:
-            self.messages.insert(0, {"role": "system", "content": system_prompt})
-        
-        
-    def send_message(self, user_message: str):
-        self._load_system_prompt()
-        self.messages.append({"role": "user", "content": user_message})
-        response = self.client.chat.completions.create(
-            model= self.model,
-            messages=self.messages,
-            temperature=0,
-            max_tokens=32000  
+        self.session = session
+        self.window = ConversationWindow(max_tokens=CHAT_TOKEN_BUDGET, keep_recent=CHAT_KEEP_RECENT)
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        # Messages live on the session so they are freed when it is evicted
+        return self.session.messages
+
+    def state_message(self) -> Dict[str, str]:
+        """
+        The per-turn session state (search counter and agent_history digests)
+        as a system message. It goes right before the latest user message and
+        is never stored, so everything ahead of it stays a stable prefix.
+        """
+        session = self.session
+        content = (
+            "### Session State\n"
+            f"- next_sr_number: {session.sr_number}\n"
+            f"- total_properties: {session.total_properties}{' shown so far, more available' if session.more_available else ''}\n"
+            f"- agent_history: {session.history.prompt_json()}"
         )
-        assistant_reply = response.choices[0].message.content
-        self.messages.append({"role": "assistant", "content": assistant_reply})
-        # Write chat history to file
-        with open('chat_history.txt', 'a', encoding='utf-8') as f:
-            f.write(json.dumps(self.messages, indent=2) + "\n")
+        return {"role": "system", "content": content}
+
+    def request_messages(self) -> List[Dict[str, str]]:
+        """
+        Static system prompt, then the conversation, then the session state
+        and the latest user message.
+        """
+        return [{"role": "system", "content": system_prompt()}] + self.messages[:-1] + [self.state_message(), self.messages[-1]]
+
+    def complete(self, prompt: str, parent=None) -> str:
+        """
+        One stateless call with only the static system prompt and `prompt`;
+        nothing is read from or recorded in the conversation, so it is safe
+        to run from several threads at once.
+        """
+        messages = [{"role": "system", "content": system_prompt()}, {"role": "user", "content": prompt}]
+        with tracer.span("llm.chat", parent=parent, model=self.model, stream=False) as span:
+            response = self.client.chat.completions.create(
+                model= self.model,
+                messages=messages,
+                temperature=0,
+                max_tokens=32000
+            )
+            self._trace_usage(span, getattr(response, "usage", None))
+            reply = response.choices[0].message.content or ""
+            span.set(reply_chars=len(reply))
+        return reply
+
+    def send_message(self, user_message: str, stream: bool = False, reference: Optional[str] = None):
+        """
+        Send a user message and return the assistant reply. With `stream=True`
+        returns a generator of reply deltas instead; the reply is recorded in
+        the conversation once the generator is exhausted or closed.
+
+        `reference` replaces the message in the stored conversation once it
+        has been answered, for prompts that embed tool output which later
+        turns don't need to resend.
+        """
+        user_entry = {"role": "user", "content": user_message}
+        self.messages.append(user_entry)
+        if stream:
+            return tracer.traced_generator(self._stream_reply(user_entry, reference), "llm.chat", model=self.model, stream=True)
+        with tracer.span("llm.chat", model=self.model, stream=False) as span:
+            response = self.client.chat.completions.create(
+                model= self.model,
+                messages=self.request_messages(),
+                temperature=0,
+                max_tokens=32000  
+            )
+            self._trace_usage(span, getattr(response, "usage", None))
+            assistant_reply = response.choices[0].message.content
+            span.set(reply_chars=len(assistant_reply or ""))
+        self._record_reply(user_entry, assistant_reply, reference)
         return assistant_reply
+
+    def _stream_reply(self, user_entry: Dict[str, str], reference: Optional[str] = None):
+        parts = []
+        span = tracer.current()
+        try:
+            response = self.client.chat.completions.create(
+                model= self.model,
+                messages=self.request_messages(),
+                temperature=0,
+                max_tokens=32000,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in response:
+                # The final chunk carries usage and no choices
+                if getattr(chunk, "usage", None) and span is not None:
+                    self._trace_usage(span, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts and span is not None:
+                        span.set(first_token_ms=round((time.perf_counter() - span._start) * 1000, 3))
+                    parts.append(delta)
+                    yield delta
+        finally:
+            if span is not None:
+                span.set(reply_chars=sum(len(part) for part in parts))
+            self._record_reply(user_entry, "".join(parts), reference)
+
+    @staticmethod
+    def _trace_usage(span, usage):
+        if usage is None:
+            return
+        span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None and getattr(details, "cached_tokens", None) is not None:
+            span.set(cached_tokens=details.cached_tokens)
+
+    def record_exchange(self, user_message: str, reply: str):
+        """
+        Record a turn that was answered without a model call, so the model
+        still sees it in the conversation.
+        """
+        user_entry = {"role": "user", "content": user_message}
+        self.messages.append(user_entry)
+        self._record_reply(user_entry, reply)
+
+    def _record_reply(self, user_entry: Dict[str, str], assistant_reply: str, reference: Optional[str] = None):
+        assistant_entry = {"role": "assistant", "content": assistant_reply}
+        self.messages.append(assistant_entry)
+        # Append only this turn to the transcript, written in the background
+        transcript.write(self.session.session_id, [user_entry, assistant_entry])
+        if reference is not None:
+            # A new dict: the transcript writer still holds the original
+            index = next((i for i in range(len(self.messages) - 1, -1, -1) if self.messages[i] is user_entry), None)
+            if index is not None:
+                self.messages[index] = {"role": "user", "content": reference}
+        self._compact()
+
+    def _compact(self):
+        if self.window.tokens(self.messages) <= self.window.max_tokens:
+            return
+        with tracer.span("chat.compact") as span:
+            stats = self.window.compact(self.messages)
+            span.set(**(stats or {}))
     
 @CrewBase
 class Bahria():
     def __init__(self):
         super().__init__()
-        self.agents_config = self._load_agents_config()
-        self.tasks_config = self._load_tasks_config()
-
-    def _load_agents_config(self):
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(base_dir, "config", "agents.yaml")
-        with open(config_path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
-
-    def _load_tasks_config(self):
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        tasks_path = os.path.join(base_dir, "config", "tasks.yaml")
-        with open(tasks_path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
-        
+        self.agents_config = copy.deepcopy(load_config("agents.yaml"))
+        self.tasks_config = copy.deepcopy(load_config("tasks.yaml"))
+
     @agent
     def property_agent(self) -> Agent:
-        agent_cfg = self.agents_config.get('property_agent', {})
-        return Agent(
-            config=agent_cfg,
-            llm = os.getenv("OPENAI_MODEL"),
-            tools=[MongoTool(result_as_answer=True)],
-            verbose= True
-        )
+        return build_property_agent(self.agents_config)
 
     @task
     def analyze_query_task(self) -> Task:
@@ -132,51 +301,349 @@ class FlowState(BaseModel):
     error: str = ""
     iteration: int = 0
     max_iterations: int = 5
+    stream: bool = False
+
+@lru_cache(maxsize=1)
+def get_crew() -> Bahria:
+    """
+    The process-wide Bahria crew; its configs are parsed once and shared by
+    every session's flow.
+    """
+    return Bahria()
+
 
 class RealEstateFlow(Flow[FlowState]):
-    def __init__(self, crew: Bahria):
+    def __init__(self, crew: Optional[Bahria] = None, session_id: Optional[str] = None):
         super().__init__(state=FlowState().model_dump())
-        self.crew = crew    
-        self.property_agent = crew.property_agent()
-        self.analyze_query_task = crew.analyze_query_task()
-        self.fetch_property_task = crew.fetch_property_task()
-        self.chater = Chat()
+        self.crew = crew or get_crew()
+        self.session_id = session_id or uuid.uuid4().hex
+        self.session = sessions.acquire(self.session_id)
+        # Built on first use: most searches compile and never need the agent.
+        # One agent per flow, since agents keep per-task executor state.
+        self.property_agent: Optional[Agent] = None
+        self.fetch_property_task_config = self.crew.tasks_config.get('fetch_property_task', {})
+        self.mongo_tool = MongoTool()
+        self.fetched_count: Optional[int] = None
+        # Where the next page of this turn's search starts, if there is one
+        self.continuation: Optional[Dict] = None
+        # False when no listing met every constraint of this turn's search
+        self.exact_match: bool = True
+        self.chater = Chat(self.session)
         
 
     @start()
     def analyze_query(self): 
         self.state.iteration = 0
+        self.continuation = None
+        self.exact_match = True
         user_input = self.state.user_input
+        # Picks up a fresh session if this one was evicted while idle
+        self.session = self.chater.session = sessions.acquire(self.session_id)
+
+        quick = classify(user_input, in_search=len(self.session.history) > 0) if QUICK_REPLIES else None
+        if quick is not None:
+            kind, reply = quick
+            # Returned as a string even when streaming; main.py renders both
+            with tracer.turn(session_id=self.session_id, stream=self.state.stream, quick_reply=True):
+                with tracer.span("quick_reply", kind=kind):
+                    self.chater.record_exchange(user_input, reply)
+            return reply
 
+        if self.state.stream:
+            return tracer.traced_generator(self._analyze_query_stream(user_input), "turn", session_id=self.session_id, stream=True)
+
+        with tracer.turn(session_id=self.session_id, stream=False):
+            return self._analyze_query(user_input)
+
+    def _analyze_query(self, user_input: str):
         try: 
-            print("agent_history:", agent_history)
+            more = self.more_request(user_input)
+            if more is not None:
+                return self.handle_analysis(more, user_input)
             
             response = self.chater.send_message(user_input)
-            print("openai response:", response)
             
 
             try:
                 analysis_dict = json.loads(response)
-
-                print(f"Cleaned result: {analysis_dict}")
-                self.state.analysis_dict = analysis_dict
-                
-                tool_output =  self.handle_property_query()
-                
-                prompt = f'For this property_query: `{property_details}`.\nHere is the tool output(data fetched from mongoDB tool against that property_query): {tool_output}.\nPlease summaries only those properties for which the user is asking in the property_query(do not summarize other irrelevant properties), as per the rules mentioned in the system prompt.'
-                # print(f"Prompt for chater: {prompt}")
-                response1 = self.chater.send_message(prompt)
-                
-                return response1
-            
-
             except json.JSONDecodeError:
                 #print("Response was not a valid JSON object:", response)
                 return response
+            return self.handle_analysis(analysis_dict, user_input) if isinstance(analysis_dict, dict) else response
             
         except Exception as e:
             return f"Error analyzing query: {str(e)}"
+
+    def _analyze_query_stream(self, user_input: str):
+        """
+        Streaming variant of `analyze_query`: yields reply deltas. A first reply
+        that starts with "{" is buffered and handled as the analysis JSON; any
+        other reply is passed through as it arrives.
+        """
+        try:
+            more = self.more_request(user_input)
+            if more is not None:
+                yield from self.handle_analysis(more, user_input, stream=True)
+                return
+            deltas = self.chater.send_message(user_input, stream=True)
+
+            head = ""
+            for delta in deltas:
+                head += delta
+                if head.strip():
+                    break
+            if not head.lstrip().startswith("{"):
+                yield head
+                yield from deltas
+                return
+
+            response = head + "".join(deltas)
+            try:
+                analysis_dict = json.loads(response)
+            except json.JSONDecodeError:
+                yield response
+                return
+            if not isinstance(analysis_dict, dict):
+                yield response
+                return
+            yield from self.handle_analysis(analysis_dict, user_input, stream=True)
+
+        except Exception as e:
+            yield f"Error analyzing query: {str(e)}"
+
+    def more_request(self, user_input: str) -> Optional[Dict]:
+        """
+        A plain "show more" continues the latest search without a model call;
+        when that search has no further page the reply is NO_MORE_RESULTS,
+        never a page of an older search. A plain "show alternatives" after a
+        search with no exact match shows its closest listings. Returns the
+        analysis dict for it, or None.
+        """
+        record = self.session.history.latest()
+        if record is None:
+            return None
+        if record["digest"].get("no_exact_match") and wants_alternatives(user_input):
+            return {"alternatives_sr_number": record["sr_number"]}
+        if not SEARCH_PAGE_SIZE or not wants_more(user_input):
+            return None
+        return {"more_sr_number": record["sr_number"]}
+
+    def handle_analysis(self, analysis_dict: Dict, user_input: str, stream: bool = False):
+        """
+        Act on the analysis JSON: recall a past search or run a new one, then
+        have the model answer from the results. Returns the reply, or a
+        generator of deltas when `stream` is set.
+        """
+        self.state.analysis_dict = analysis_dict
+
+        if "recall_sr_number" in analysis_dict:
+            return self.recall_past_search(analysis_dict["recall_sr_number"], user_input, stream=stream)
+        if "more_sr_number" in analysis_dict:
+            return self.show_more(analysis_dict["more_sr_number"], user_input, stream=stream)
+        if "alternatives_sr_number" in analysis_dict:
+            return self.show_alternatives(analysis_dict["alternatives_sr_number"], user_input, stream=stream)
         
+        tool_output =  self.handle_property_query()
+        if tool_output == SEARCH_TOO_BROAD:
+            self.chater.record_exchange(user_input, SEARCH_TOO_BROAD)
+            return iter([SEARCH_TOO_BROAD]) if stream else SEARCH_TOO_BROAD
+        return self.present_results(tool_output, stream=stream)
+
+    def present_results(self, tool_output, stream: bool = False):
+        """
+        Answer from a search's tool output, followed by the "show more" hint
+        when the search has another page.
+        """
+        reply = self._present_results(tool_output, stream=stream)
+        if self.continuation is None:
+            return reply
+        if stream:
+            return self._append_stream(reply, "\n\n" + SHOW_MORE_HINT)
+        return reply + "\n\n" + SHOW_MORE_HINT
+
+    @staticmethod
+    def _append_stream(deltas, text: str):
+        yield from deltas
+        yield text
+
+    def _present_results(self, tool_output, stream: bool = False):
+        if not self.exact_match:
+            # The "No exact matches found" rule: no listings unless the user
+            # asks for alternatives
+            reference = f'For this property_query: `{self.session.property_details}`, no property matched exactly.'
+            self.chater.record_exchange(reference, NO_MATCH_REPLY)
+            return iter([NO_MATCH_REPLY]) if stream else NO_MATCH_REPLY
+        listings = self.decode_listings(tool_output) if RENDER_SUMMARIES or SUMMARY_CHUNK_SIZE else None
+        if listings and RENDER_SUMMARIES:
+            return self.present_listings(listings, stream=stream)
+
+        # Later turns only need to know the results were shown; the full
+        # results stay in agent_history for recall
+        reference = f'For this property_query: `{self.session.property_details}`, summarize the {len(listings) if listings else self.session.total_properties} properties shown (full results are in agent_history).'
+        if listings and SUMMARY_CHUNK_SIZE and len(listings) > SUMMARY_CHUNK_SIZE:
+            replies = self.summarize_in_chunks(listings, reference)
+            return replies if stream else "".join(replies)
+
+        prompt = f'For this property_query: `{self.session.property_details}`.\nHere is the tool output(data fetched from mongoDB tool against that property_query): {tool_output}.\nPlease summaries only those properties for which the user is asking in the property_query(do not summarize other irrelevant properties), as per the rules mentioned in the system prompt.'
+        # print(f"Prompt for chater: {prompt}")
+        return self.chater.send_message(prompt, stream=stream, reference=reference)
+        
+    @staticmethod
+    def decode_listings(tool_output) -> Optional[List[Dict]]:
+        """
+        The listing documents in a JSON tool output, or None for apologies,
+        errors and anything else that isn't a non-empty list of documents.
+        """
+        if not isinstance(tool_output, str) or not tool_output.startswith("["):
+            return None
+        try:
+            listings = json_util.loads(tool_output)
+        except ValueError:
+            return None
+        if not isinstance(listings, list) or not listings or not all(isinstance(doc, dict) for doc in listings):
+            return None
+        return listings
+
+    def summarize_in_chunks(self, listings: List[Dict], reference: str):
+        """
+        Map-reduce summarization for large result sets: every chunk of
+        SUMMARY_CHUNK_SIZE listings is summarized by its own model call, the
+        calls run in parallel, and the summaries are yielded in order between
+        the stock intro and follow-up question as soon as each is ready.
+        The stitched reply is recorded as one turn once it is complete.
+        """
+        chunks = [listings[i:i + SUMMARY_CHUNK_SIZE] for i in range(0, len(listings), SUMMARY_CHUNK_SIZE)]
+        parts = [DEFAULT_INTRO + "\n\n"]
+        futures = []
+        try:
+            yield parts[0]
+            with tracer.span("summarize", docs=len(listings), chunks=len(chunks)) as span:
+                for index, chunk in enumerate(chunks):
+                    start = index * SUMMARY_CHUNK_SIZE + 1
+                    prompt = (
+                        f'For this property_query: `{self.session.property_details}`.\n'
+                        f'Here are properties {start}-{start + len(chunk) - 1} of {len(listings)} fetched from mongoDB tool against that property_query: '
+                        f'[{",".join(compact_dumps(doc) for doc in chunk)}].\n'
+                        'Please summaries only those properties for which the user is asking in the property_query(do not summarize other irrelevant properties), in the Summary Format. '
+                        'The other properties are summarized separately, so do not add an introduction or a follow up question.'
+                    )
+                    futures.append(summary_executor().submit(self.chater.complete, prompt, span))
+                for future in futures:
+                    part = future.result().strip() + "\n\n"
+                    parts.append(part)
+                    yield part
+            parts.append(DEFAULT_FOLLOW_UP)
+            yield DEFAULT_FOLLOW_UP
+        finally:
+            for future in futures:
+                future.cancel()
+            self.chater.record_exchange(reference, "".join(parts))
+
+    def present_listings(self, listings: List[Dict], stream: bool = False):
+        """
+        Render every listing from its document and ask the model only for a
+        one-line intro and a follow-up question. Returns the reply, or a
+        generator of chunks when `stream` is set.
+        """
+        with tracer.span("render", docs=len(listings)) as span:
+            blocks = render_listings(listings)
+            span.set(chars=sum(len(block) for block in blocks))
+        types = dict(Counter(str(doc.get("property_type", "unknown")) for doc in listings))
+        prompt = (
+            f'For this property_query: `{self.session.property_details}`, the search found {len(listings)} matching properties ({json.dumps(types)}). '
+            'They are shown to the user separately in the Summary Format, so do not list or summarize them. '
+            'Reply with exactly two lines: first a one-sentence introduction to the results '
+            '(e.g. "We have found following properties matching your criteria."), then the follow up question for the end of the summaries.'
+        )
+        if stream:
+            return self._present_listings_stream(prompt, blocks)
+        intro, follow_up = split_intro(self.chater.send_message(prompt))
+        return intro + "\n\n" + "".join(blocks) + follow_up
+
+    def _present_listings_stream(self, prompt: str, blocks: List[str]):
+        deltas = self.chater.send_message(prompt, stream=True)
+        # Send the listings as soon as the intro line is complete, while the
+        # model is still writing the follow-up question
+        head = ""
+        for delta in deltas:
+            head += delta
+            if "\n" in head.strip():
+                break
+        intro, _ = split_intro(head)
+        yield intro + "\n\n"
+        yield from blocks
+        _, follow_up = split_intro(head + "".join(deltas))
+        yield follow_up
+
+    def show_alternatives(self, sr_number, user_input: str, stream: bool = False):
+        """
+        The user asked for alternatives to a search with no exact match: show
+        its closest listings under their own header rather than as matches.
+        Rendered without a model call, also when RENDER_SUMMARIES is off.
+        """
+        try:
+            record = self.session.history.get(int(sr_number))
+        except (TypeError, ValueError):
+            record = None
+        listings = self.decode_listings(record["tool_output"]) if record and record["digest"].get("no_exact_match") else None
+        if not listings:
+            self.chater.record_exchange(user_input, NO_ALTERNATIVES)
+            return iter([NO_ALTERNATIVES]) if stream else NO_ALTERNATIVES
+
+        self.session.property_details = record["property_details"]
+        with tracer.span("render", docs=len(listings), exact=False) as span:
+            blocks = render_listings(listings)
+            span.set(chars=sum(len(block) for block in blocks))
+        self.chater.record_exchange(user_input, f"{ALTERNATIVES_HEADER} ({len(blocks)} listings shown)\n\n{ADJUST_FILTERS}")
+        parts = [ALTERNATIVES_HEADER + "\n\n"] + blocks + [ADJUST_FILTERS]
+        return iter(parts) if stream else "".join(parts)
+
+    def show_more(self, sr_number, user_input: str, stream: bool = False):
+        """
+        Present the next page of a paginated search from its stored
+        continuation; the pages already shown are not read again.
+        """
+        try:
+            record = self.session.history.get(int(sr_number))
+        except (TypeError, ValueError):
+            record = None
+        continuation = record.get("continuation") if record else None
+        if not continuation:
+            self.chater.record_exchange(user_input, NO_MORE_RESULTS)
+            return iter([NO_MORE_RESULTS]) if stream else NO_MORE_RESULTS
+
+        session = self.session
+        session.property_details = record["property_details"]
+        with tracer.span("search", path="page") as span:
+            try:
+                tool_output, self.continuation, _ = self.fetch_page(continuation["pipeline"], record["property_details"], after=continuation["after"])
+            except QueryRejected as e:
+                print(f"[Info] Next page rejected by the query guard: {str(e)}")
+                self.chater.record_exchange(user_input, SEARCH_TOO_BROAD)
+                return iter([SEARCH_TOO_BROAD]) if stream else SEARCH_TOO_BROAD
+            span.set(docs=self.fetched_count or 0, payload_bytes=len(tool_output))
+        session.history.append_page(record["sr_number"], tool_output, self.fetched_count or 0, self.continuation)
+        session.total_properties = session.history.shown_count(session.history.get(record["sr_number"]) or record)
+        session.more_available = self.continuation is not None
+        if not self.fetched_count:
+            self.chater.record_exchange(user_input, NO_MORE_RESULTS)
+            return iter([NO_MORE_RESULTS]) if stream else NO_MORE_RESULTS
+        return self.present_results(tool_output, stream=stream)
+
+    def recall_past_search(self, recall_sr_number, user_input: str, stream: bool = False):
+        """
+        Answer a question about a past search with its full stored results.
+        """
+        try:
+            record = self.session.history.get(int(recall_sr_number))
+        except (TypeError, ValueError):
+            record = None
+        if record is None:
+            return self.chater.send_message(f'The search with sr_number `{recall_sr_number}` is no longer available. Tell the user politely and offer to run the search again.', stream=stream)
+        prompt = f'Here are the full results of past search sr_number {record["sr_number"]} (`{record["property_details"]}`): {record["tool_output"]}.\nUsing only these results, answer the user\'s question: `{user_input}`, in bullet points as per the rules mentioned in the system prompt.'
+        reference = f'Answer the user\'s question `{user_input}` from the full results of past search sr_number {record["sr_number"]} (`{record["property_details"]}`).'
+        return self.chater.send_message(prompt, stream=stream, reference=reference)
+
     @listen('property_query')
     def handle_property_query(self):
         
@@ -190,39 +657,182 @@ class RealEstateFlow(Flow[FlowState]):
             return response
         
         #user_input = self.state.user_input
-        global property_details, agent_output, sr_number, agent_history, total_properties
-        property_details = self.state.analysis_dict.get("property_details", "")
+        session = self.session
+        property_details = session.property_details = self.state.analysis_dict.get("property_details", "")
+        try:
+            self.fetched_count = None
+            with tracer.span("search") as span:
+                tool_output = self.fetch_compiled(property_details)
+                if tool_output is None:
+                    tool_output = self.fetch_with_agent(property_details)
+                span.set(
+                    path="compiled" if self.fetched_count is not None else "agent",
+                    docs=self.fetched_count or 0,
+                    payload_bytes=len(tool_output) if isinstance(tool_output, str) else 0,
+                )
+            if tool_output == SEARCH_TOO_BROAD:
+                session.total_properties = 0
+                session.more_available = False
+                return tool_output
+            if self.fetched_count is not None:
+                session.total_properties = self.fetched_count
+            else:
+                session.total_properties = len(tool_output) if isinstance(tool_output, list) else 0
+            # Re-runs come back with the earlier search's sr_number
+            record_sr_number = self.state.analysis_dict.get("sr_number") or session.sr_number
+            if not isinstance(record_sr_number, int):
+                record_sr_number = session.sr_number
+            # History keeps the listings that match, as paged searches do, so
+            # the digest and the session state count the same listings
+            tool_output, exact = self.narrow_results(property_details, tool_output)
+            self.exact_match = self.exact_match and exact
+            session.more_available = self.continuation is not None
+            session.history.record(record_sr_number, property_details, tool_output, session.total_properties, continuation=self.continuation, exact_match=self.exact_match)
+            session.total_properties = session.history.shown_count(session.history.get(record_sr_number)) if self.exact_match else 0
+            session.sr_number = max(session.sr_number, record_sr_number + 1)
+            return tool_output
+        except Exception as e:
+            error_msg = f"Error fetching property data: {str(e)}"
+            
+            return error_msg
+
+    def narrow_results(self, property_details, tool_output):
+        """
+        Keep only the listings that satisfy the constraints extracted from
+        `property_details`. Returns (tool_output, exact_match): `tool_output`
+        is unchanged when it isn't a JSON list or no constraint was found;
+        when nothing matches it holds the MAX_ALTERNATIVES closest listings,
+        kept for a later request for alternatives, and exact_match is False.
+        """
+        if not LOCAL_FILTERING or not isinstance(tool_output, str) or not tool_output.startswith("["):
+            return tool_output, True
+        filters = extract_filters(property_details)
+        if not filters:
+            return tool_output, True
+        with tracer.span("search.filter", filters=sorted(filters)) as span:
+            try:
+                listings = json_util.loads(tool_output)
+            except ValueError:
+                return tool_output, True
+            matched = filter_listings(listings, filters)
+            span.set(docs_in=len(listings), docs_out=len(matched))
+        if not matched:
+            return "[" + ",".join(compact_dumps(doc) for doc in closest_listings(listings, filters, MAX_ALTERNATIVES)) + "]", False
+        if len(matched) == len(listings):
+            return tool_output, True
+        self.session.total_properties = len(matched)
+        return "[" + ",".join(compact_dumps(doc) for doc in matched) + "]", True
+
+    def fetch_compiled(self, property_details):
+        """
+        Run the canonical city/society pipeline directly through MongoTool,
+        without asking the agent to write it. Returns None when the query
+        can't be compiled or the tool reports an error, so the caller can
+        fall back to the agent, and SEARCH_TOO_BROAD when the query guard
+        rejects it: the agent's own query would be no narrower.
+        """
+        # Prefer structured fields when the analysis JSON carries them
+        analysis = self.state.analysis_dict or {}
+        source = analysis if analysis.get("city") and analysis.get("society") else property_details
+        pipeline = compile_pipeline(source)
+        if not pipeline:
+            print(f"[Info] Could not compile property_details, falling back to agent: {property_details}")
+            return None
+        if SEARCH_PAGE_SIZE:
+            try:
+                with tracer.span("search.compiled", paged=True):
+                    tool_output, self.continuation, self.exact_match = self.fetch_page(pipeline, property_details)
+            except QueryRejected as e:
+                return self._rejected(e)
+            except Exception as e:
+                print(f"[Info] Compiled pipeline failed, falling back to agent: {str(e)}")
+                return None
+            return tool_output
+
+        # Consume the cursor page by page; only one page of documents is
+        # held in memory while the JSON payload is built.
+        chunks = []
+        try:
+            with tracer.span("search.compiled"):
+                for chunk in self.mongo_tool.stream(pipeline=pipeline, collection_hint=PROPERTY_COLLECTIONS[0]):
+                    chunks.append(chunk)
+        except QueryRejected as e:
+            return self._rejected(e)
+        except Exception as e:
+            print(f"[Info] Compiled pipeline failed, falling back to agent: {str(e)}")
+            return None
+        self.fetched_count = self.mongo_tool.last_count
+        return "".join(chunks)
+
+    def _rejected(self, error: QueryRejected) -> str:
+        print(f"[Info] Compiled pipeline rejected by the query guard: {str(error)}")
+        self.fetched_count = 0
+        self.continuation = None
+        return SEARCH_TOO_BROAD
+
+    def fetch_page(self, pipeline: List[Dict], property_details, after=None):
+        """
+        Read `pipeline` in `_id` order after `after` until SEARCH_PAGE_SIZE
+        listings satisfy the local filters from `property_details`, scanning
+        at most MongoTool.max_documents. Sets `fetched_count` and returns
+        (tool_output, continuation, exact_match), where continuation is None
+        once the results are exhausted. Like `narrow_results`, when nothing on
+        a first page matches at all, the closest listings of the first batch
+        are returned with exact_match False and no continuation.
+        """
+        filters = extract_filters(property_details) if LOCAL_FILTERING else {}
+        predicate = compile_predicate(filters) if filters else None
+        # Read ahead further when filters will drop part of each page
+        batch = SEARCH_PAGE_SIZE if predicate is None else max(SEARCH_PAGE_SIZE, 50)
+        max_scan = self.mongo_tool.max_documents or float("inf")
+
+        matched, first_batch, scanned, cursor, more = [], None, 0, after, True
+        while more and len(matched) < SEARCH_PAGE_SIZE and scanned < max_scan:
+            docs, more = self.mongo_tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], after=cursor, page_size=batch)
+            first_batch = first_batch if first_batch is not None else docs
+            scanned += len(docs)
+            for index, doc in enumerate(docs):
+                cursor = doc["_id"]
+                if predicate is None or predicate(doc):
+                    matched.append(doc)
+                    if len(matched) == SEARCH_PAGE_SIZE:
+                        more = more or index < len(docs) - 1
+                        break
+        self.fetched_count = len(matched)
+        if not matched and after is None and first_batch:
+            alternatives = closest_listings(first_batch, filters, MAX_ALTERNATIVES)
+            return self._page_output(alternatives), None, False
+        if not matched:
+            return NO_DATA_MESSAGE, None, True
+        continuation = {"pipeline": pipeline, "after": cursor} if more else None
+        return self._page_output(matched), continuation, True
+
+    @staticmethod
+    def _page_output(docs: List[Dict]) -> str:
+        return "[" + ",".join(compact_dumps({k: v for k, v in doc.items() if k != "_id"}) for doc in docs) + "]"
+
+    def fetch_with_agent(self, property_details):
+        """
+        Let the property agent write and run the pipeline from `prompt.txt`.
+        """
         prompt = self.state.prompt
+        if self.property_agent is None:
+            self.property_agent = build_property_agent(self.crew.agents_config)
        # context = self.chat.history
-        task_description = self.fetch_property_task.description.format(
+        task_description = self.fetch_property_task_config.get('description', '').format(
             user_input=property_details,
             prompt=prompt,
         #    context=context
         )
         formatted_task = Task(
             description=task_description,
-            expected_output=self.fetch_property_task.expected_output,
+            expected_output=self.fetch_property_task_config.get('expected_output', ''),
             agent=self.property_agent,
         )
-        try:
-            property_result = self.property_agent.execute_task(formatted_task, property_details)
-            tool_output = property_result
-            total_properties = len(tool_output) if isinstance(tool_output, list) else 0
-            agent_history.append({
-            "sr_number": sr_number,
-            "property_details": property_details,
-            "tool_output": tool_output
-        })
-            sr_number += 1
-            
-            print(f"value replaced in agent_output: {tool_output}")
-            # print(f"Chat history length: {len(self.chater.history)}")
-            # print(f"Chat history : {self.chater.history}")
-            return property_result
-        except Exception as e:
-            error_msg = f"Error fetching property data: {str(e)}"
-            
-            return error_msg
+        with tracer.span("search.agent") as span:
+            output = self.property_agent.execute_task(formatted_task, property_details)
+            span.set(payload_bytes=len(output) if isinstance(output, str) else 0)
+        return output
 
     @listen("unknown_query")
     def handle_unknown_query(self):
@@ -0,0 +1,143 @@
+import json
+from collections import OrderedDict, Counter
+from typing import Optional, List, Dict
+
+from bson.json_util import loads
+from bson.errors import InvalidBSON
+
+from summaries import listing_title
+
+
+class SearchHistory:
+    """
+    Results of past property searches, indexed by `sr_number`.
+    Full tool outputs stay here; the system prompt only gets compact digests
+    (see `digests()`), and a full record is handed to the model only when the
+    user asks about that search. Bounded by entry count and total bytes, oldest
+    searches are dropped first.
+    """
+
+    def __init__(self, max_entries: int = 20, max_bytes: int = 2 * 1024 * 1024, sample_size: int = 5):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+        self._records: "OrderedDict[int, Dict]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, sr_number: int, property_details: str, tool_output, total_properties: int, continuation: Optional[Dict] = None, exact_match: bool = True):
+        """
+        Store a search result. Re-running a search with the same `sr_number`
+        replaces the earlier result. `continuation` is where the next page of
+        a paginated search starts, or None when every result was fetched;
+        while it is set the digest has `shown_properties` and
+        `more_available` instead of `total_properties`, since only the
+        listings shown so far are known. `exact_match` is False when no
+        listing met every constraint; `tool_output` then holds the closest
+        alternatives, counted as `alternatives` in the digest.
+        """
+        tool_output = tool_output if isinstance(tool_output, str) else json.dumps(tool_output, default=str)
+        if sr_number in self._records:
+            self._drop(sr_number)
+        self._records[sr_number] = {
+            "sr_number": sr_number,
+            "property_details": property_details,
+            "tool_output": tool_output,
+            "digest": self._digest(sr_number, property_details, tool_output, total_properties),
+            "continuation": continuation,
+        }
+        if continuation is not None:
+            digest = self._records[sr_number]["digest"]
+            digest["shown_properties"] = digest.pop("total_properties")
+            digest["more_available"] = True
+        if not exact_match:
+            # The stored listings are the closest alternatives, not matches
+            digest = self._records[sr_number]["digest"]
+            digest["alternatives"] = digest.pop("total_properties", 0)
+            digest.pop("property_types", None)
+            digest.pop("sample", None)
+            digest["total_properties"] = 0
+            digest["no_exact_match"] = True
+        self._bytes += len(tool_output)
+        while len(self._records) > 1 and (len(self._records) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._records)))
+
+    def append_page(self, sr_number: int, tool_output: str, page_count: int, continuation: Optional[Dict]):
+        """
+        Add the next page (`page_count` listings) of a paginated search to its
+        record, so recall sees every listing shown so far.
+        """
+        record = self._records.get(sr_number)
+        if record is None:
+            return
+        combined = record["tool_output"]
+        if combined.startswith("[") and tool_output.startswith("["):
+            combined = combined[:-1] + "," + tool_output[1:] if combined != "[]" else tool_output
+        self.record(sr_number, record["property_details"], combined, self.shown_count(record) + page_count, continuation)
+
+    @staticmethod
+    def shown_count(record: Dict) -> int:
+        """
+        Listings of a search shown so far (every match once it is complete).
+        """
+        digest = record["digest"]
+        return digest.get("total_properties", digest.get("shown_properties", 0))
+
+    def latest(self) -> Optional[Dict]:
+        """
+        The most recently recorded search (re-runs and new pages count as
+        recorded), or None.
+        """
+        return next(reversed(self._records.values()), None)
+
+    def get(self, sr_number: int) -> Optional[Dict]:
+        """
+        Full record (including `tool_output`) for a past search, or None.
+        """
+        return self._records.get(sr_number)
+
+    def digests(self) -> List[Dict]:
+        return [record["digest"] for record in self._records.values()]
+
+    def prompt_json(self) -> str:
+        """
+        Digests as the compact JSON array the system prompt embeds.
+        """
+        return json.dumps(self.digests(), ensure_ascii=False, separators=(",", ":"))
+
+    def clear(self):
+        self._records.clear()
+        self._bytes = 0
+
+    def _drop(self, sr_number: int):
+        record = self._records.pop(sr_number)
+        self._bytes -= len(record["tool_output"])
+
+    def _digest(self, sr_number: int, property_details: str, tool_output: str, total_properties: int) -> Dict:
+        digest = {
+            "sr_number": sr_number,
+            "property_details": property_details,
+            "total_properties": total_properties,
+        }
+        try:
+            docs = loads(tool_output) if tool_output.lstrip().startswith("[") else None
+        except (ValueError, InvalidBSON):
+            docs = None
+        if not isinstance(docs, list):
+            # Apology or error text from the search
+            digest["note"] = tool_output[:200]
+            return digest
+
+        digest["total_properties"] = len(docs)
+        digest["property_types"] = dict(Counter(str(doc.get("property_type", "unknown")) for doc in docs if isinstance(doc, dict)))
+        digest["sample"] = [self._title(doc) for doc in docs[:self.sample_size] if isinstance(doc, dict)]
+        return digest
+
+    @staticmethod
+    def _title(doc: Dict) -> str:
+        title = listing_title(doc)
+        if doc.get("price") not in (None, ""):
+            title += f", PKR {doc['price']}"
+        return title
@@ -2,9 +2,8 @@ __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
-from crew import RealEstateFlow, Bahria
 import streamlit as st
-import warnings, os
+import warnings, os, uuid
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,14 +25,19 @@ def run():
     Run the crew.
     """
     st.title("🏠 AI Real-Estate Agent")
+    # crewai takes seconds to import; the title renders first. Later reruns
+    # find these modules already loaded.
+    from crew import RealEstateFlow
+    from tracing import ensure_metrics_server
+    ensure_metrics_server()
 
     # Initialize session state for messages and flow
     if "messages" not in st.session_state:
         st.session_state.messages = []
     if "flow" not in st.session_state:
-        # Initialize Bahria crew and RealEstateFlow once
-        bahria_crew = Bahria()
-        st.session_state.flow = RealEstateFlow(crew=bahria_crew)
+        # One RealEstateFlow per browser session, sharing the process-wide crew
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.flow = RealEstateFlow(session_id=st.session_state.session_id)
 
     # Display chat history
     for message in st.session_state.messages:
@@ -58,18 +62,22 @@ def run():
                 st.markdown(response)
             st.stop()
 
-        # Run the flow to get the response
-        try:
-            response = flow.kickoff(inputs={"user_input": user_input, "prompt": prompt_template})
-            if not response:  # Debug: Check if response is empty
-                response = "Error: No response returned from the agent."
-        except Exception as e:
-            response = f"Error processing your request: {str(e)}"
+        # Run the flow and render the reply as it streams in
+        with st.chat_message("assistant"):
+            try:
+                response = flow.kickoff(inputs={"user_input": user_input, "prompt": prompt_template, "stream": True})
+                if not response:  # Debug: Check if response is empty
+                    response = "Error: No response returned from the agent."
+                if isinstance(response, str):
+                    st.markdown(response)
+                else:
+                    response = st.write_stream(response)
+            except Exception as e:
+                response = f"Error processing your request: {str(e)}"
+                st.markdown(response)
 
-        # Append and display assistant response
+        # Append assistant response
         st.session_state.messages.append({"role": "assistant", "content": response})
-        with st.chat_message("assistant"):
-            st.markdown(response)
 
 
 if __name__ == "__main__":
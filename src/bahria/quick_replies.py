@@ -0,0 +1,105 @@
+import re
+from typing import Optional, Tuple
+
+from tools.query_compiler import CITY_ALIASES, SOCIETY_ALIASES, PROPERTY_TYPE_ALIASES, _find_terms
+
+
+# Canned replies, worded as in the examples in config/tasks.yaml
+GREETING = "Hello! Welcome to AI Real-Estate Agent. How can I help with your property search?"
+NAMED_GREETING = "Hello {name}! Welcome to AI Real-Estate Agent."
+THANKS = "You're welcome! Let me know if you'd like to search for another property."
+GOODBYE = "Goodbye! Come back anytime you need help finding a property."
+OFF_TOPIC = "I’m here to assist with property searches in Pakistan. What kind of property are you looking for?"
+HARMFUL = "I’m designed to help with real estate queries in a safe and friendly way. Please provide a property-related request, and I’ll assist you!"
+
+_GREETING = r"(?:hi+|hello|hey|hiya|salam|salaam|assalam[ou]?\s*o?\s*alaikum|aoa|good\s+(?:morning|afternoon|evening))"
+_NAME = r"([a-z]{2,20})"
+_GREETING_RE = re.compile(
+    rf"{_GREETING}(?:\s+there)?(?:[\s,!.]+(?:{_NAME}\s+here|i\s*am\s+{_NAME}|i'm\s+{_NAME}|this\s+is\s+{_NAME}|my\s+name\s+is\s+{_NAME}))?"
+)
+_THANKS_RE = re.compile(r"(?:ok(?:ay)?[\s,]+)?(?:thanks?(?:\s+you)?|thank\s+you(?:\s+so\s+much)?|thx|ty|shukriya)(?:\s+a\s+lot)?")
+_GOODBYE_RE = re.compile(r"(?:ok(?:ay)?[\s,]+)?(?:bye|good\s*bye|exit|quit|see\s+you|allah\s+hafiz|khuda\s+hafiz)")
+
+# "show more" and its variants, continuing the latest paginated search
+_SHOW_MORE_RE = re.compile(
+    r"(?:(?:ok(?:ay)?|yes|please)[\s,]+)?(?:(?:show|load|see|give|list|display)\s+(?:me\s+)?)?"
+    r"(?:some\s+|the\s+)?(?:more|next)(?:\s+(?:results|properties|property|listings|options|page))?(?:\s+please)?"
+)
+
+# "show alternatives" and its variants, after a search with no exact match
+_ALTERNATIVES_RE = re.compile(
+    r"(?:(?:ok(?:ay)?|yes|please)[\s,]+)?(?:(?:show|see|give|list|suggest)\s+(?:me\s+)?)?"
+    r"(?:some\s+|the\s+|any\s+)?(?:closest\s+|similar\s+|other\s+)?(?:alternatives?|suggestions|options|matches)(?:\s+please)?"
+)
+
+# Attempts to tamper with the app or its instructions
+_HARMFUL_RE = re.compile(
+    r"\b(?:(?:delete|drop|wipe|truncate)\s+(?:the\s+|your\s+|all\s+)*(?:database|db|collections?|tables?|records)"
+    r"|ignore\s+(?:all\s+|the\s+|your\s+|previous\s+|prior\s+)*(?:instructions|rules|prompt)"
+    r"|(?:reveal|show|print|leak)\s+(?:me\s+)?(?:the\s+|your\s+)*system\s+prompt"
+    r"|hack(?:ing)?\s+(?:the\s+|this\s+|your\s+)*(?:system|app|application|server|database))\b"
+)
+
+# Topics that are off-topic unless the message also names a city, society or
+# property type. Words that also occur in property questions ("match my
+# budget", "3 story building", "news on possession") are left out.
+_OFF_TOPIC_RE = re.compile(
+    r"\b(?:cricket|football|weather|joke|jokes|poem|song|lyrics|recipe|movie|movies|politics|homework|essay)\b"
+)
+
+# Words that make a name capture something other than a name
+_NOT_NAMES = {"here", "there", "looking", "interested", "searching", "back", "fine", "good", "ok", "okay"}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower()).strip(" !.?~")
+
+
+def _mentions_property(text: str) -> bool:
+    return any(_find_terms(text, aliases) for aliases in (CITY_ALIASES, SOCIETY_ALIASES, PROPERTY_TYPE_ALIASES))
+
+
+def wants_more(user_input: str) -> bool:
+    """
+    Whether the whole message asks for the next page of results ("show more",
+    "more please", "next page").
+    """
+    return _SHOW_MORE_RE.fullmatch(_normalize(user_input or "")) is not None
+
+
+def wants_alternatives(user_input: str) -> bool:
+    """
+    Whether the whole message asks for alternatives ("show alternatives",
+    "any similar options", "yes, suggestions please").
+    """
+    return _ALTERNATIVES_RE.fullmatch(_normalize(user_input or "")) is not None
+
+
+def classify(user_input: str, in_search: bool = False) -> Optional[Tuple[str, str]]:
+    """
+    Return (kind, reply) for turns that need no model call: whole-message
+    greetings, thanks and goodbyes, attempts to tamper with the app, and
+    off-topic requests that name no city, society or property type. Once the
+    session has a search (`in_search`), off-topic-looking follow-ups are left
+    to the model, which sees the conversation. Returns None for everything
+    else.
+    """
+    text = _normalize(user_input or "")
+    if not text or len(text) > 200:
+        return None
+    if _HARMFUL_RE.search(text):
+        return "harmful", HARMFUL
+
+    greeting = _GREETING_RE.fullmatch(text)
+    if greeting:
+        name = next((group for group in greeting.groups() if group), None)
+        if name and name not in _NOT_NAMES:
+            return "greeting", NAMED_GREETING.format(name=name.capitalize())
+        return ("greeting", GREETING) if not name else None
+    if _THANKS_RE.fullmatch(text):
+        return "thanks", THANKS
+    if _GOODBYE_RE.fullmatch(text):
+        return "goodbye", GOODBYE
+    if not in_search and _OFF_TOPIC_RE.search(text) and not _mentions_property(text):
+        return "off_topic", OFF_TOPIC
+    return None
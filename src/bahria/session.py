@@ -0,0 +1,101 @@
+import os, time, threading
+from collections import OrderedDict
+from typing import List, Dict
+from pydantic import BaseModel, ConfigDict, Field
+
+from history import SearchHistory
+
+
+def _new_history() -> SearchHistory:
+    return SearchHistory(
+        max_entries=int(os.getenv("HISTORY_MAX_ENTRIES", "20")),
+        max_bytes=int(os.getenv("HISTORY_MAX_BYTES", str(2 * 1024 * 1024))),
+    )
+
+
+class SessionState(BaseModel):
+    """
+    Everything one conversation accumulates: the chat messages, the search
+    counter and the past search results. One per Streamlit session.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    session_id: str
+    property_details: str = ""
+    sr_number: int = 1
+    total_properties: int = 0
+    # The latest search has another page, so total_properties only counts
+    # the listings shown so far
+    more_available: bool = False
+    messages: List[Dict[str, str]] = Field(default_factory=list)
+    history: SearchHistory = Field(default_factory=_new_history)
+    last_active: float = Field(default_factory=time.monotonic)
+
+    def reset(self):
+        """
+        Drop everything the session holds, so evicted sessions free their memory
+        even while a stale flow still references them.
+        """
+        self.property_details = ""
+        self.sr_number = 1
+        self.total_properties = 0
+        self.more_available = False
+        self.messages.clear()
+        self.history.clear()
+
+
+class SessionRegistry:
+    """
+    Process-wide registry of live sessions. Sessions idle for longer than
+    `idle_ttl_seconds` are evicted, and the least recently active ones are
+    evicted once there are more than `max_sessions`.
+    """
+
+    def __init__(self, idle_ttl_seconds: float, max_sessions: int):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def acquire(self, session_id: str) -> SessionState:
+        """
+        Return the live session for `session_id`, creating a fresh one if it
+        never existed or was evicted, and mark it active.
+        """
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionState(session_id=session_id)
+                self._sessions[session_id] = session
+            session.last_active = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                oldest.reset()
+            return session
+
+    def release(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                session.reset()
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        # Ordered by last activity, so stop at the first live session
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            del self._sessions[session_id]
+            session.reset()
+
+
+sessions = SessionRegistry(
+    idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+    max_sessions=int(os.getenv("SESSION_MAX", "500")),
+)
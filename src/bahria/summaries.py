@@ -0,0 +1,141 @@
+from typing import Optional, List, Dict, Tuple
+
+
+# The "Summary Format" from config/tasks.yaml, rendered from the listing
+# documents instead of being written by the model.
+DEFAULT_INTRO = "We have found following properties matching your criteria."
+DEFAULT_FOLLOW_UP = "Could you please tell me more about the property you are interested in?"
+
+# No listing met every constraint: the reply is exactly the "No exact matches
+# found" rule in config/tasks.yaml. The closest listings are only shown, under
+# their own header, when the user asks for alternatives.
+NO_EXACT_MATCH = "No exact matches found for your request."
+ADJUST_FILTERS = "Would you like to adjust your filters?"
+NO_MATCH_REPLY = f"{NO_EXACT_MATCH} {ADJUST_FILTERS}"
+ALTERNATIVES_HEADER = "These are the closest alternatives from the same area. They do not meet all of your criteria:"
+NO_ALTERNATIVES = "There are no alternatives to show for that search. Would you like to start a new search?"
+
+# Paginated searches (SEARCH_PAGE_SIZE)
+SHOW_MORE_HINT = 'There are more properties matching your search. Say "show more" to see them.'
+NO_MORE_RESULTS = "There are no more properties for that search. Would you like to adjust your filters?"
+
+# The query guard refused the search (see tools/query_guard.py)
+SEARCH_TOO_BROAD = "That search is too broad to run. Could you narrow it down, for example with the city, society and property type?"
+
+# Property types that show Building Name / Commercial Name
+_BUILDING_TYPES = {"apartment", "shop"}
+
+_ALLOTMENT_DETAILS = [
+    ("plot", "Plot"),
+    ("street", "Street"),
+    ("category", "Category"),
+    ("road_width", "Road Width"),
+    ("map_charges", "Map Charges"),
+    ("development_charges", "Development Charges"),
+    ("possessionUitilityCharges", "Possession Utility Charges"),
+]
+
+
+def _present(value) -> bool:
+    return value not in (None, "", [], {})
+
+
+def _size(value) -> Optional[str]:
+    if isinstance(value, dict):
+        text = " ".join(str(value[key]) for key in ("value", "unit") if _present(value.get(key)))
+        return text or None
+    return str(value) if _present(value) else None
+
+
+def _price(value) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"PKR {value:,.0f}" if float(value).is_integer() else f"PKR {value:,}"
+    return str(value)
+
+
+def _extra_land(value) -> Optional[str]:
+    # Plots store "no extra land" as a zero value
+    if isinstance(value, dict) and value.get("value") in (0, "0"):
+        return None
+    return _size(value)
+
+
+def listing_title(doc: Dict) -> str:
+    """
+    "[society] [size] [property_type] for [list_type]", skipping missing parts.
+    """
+    parts = [doc.get("society"), _size(doc.get("size")), doc.get("property_type")]
+    title = " ".join(str(p) for p in parts if _present(p))
+    if _present(doc.get("list_type")):
+        title += f" for {doc['list_type']}"
+    return title or "Property"
+
+
+def _allotment(value) -> Optional[str]:
+    if not isinstance(value, dict):
+        return str(value) if _present(value) else None
+    details = value.get("details") if isinstance(value.get("details"), dict) else {}
+    parts = [f"Status: {value['status']}"] if _present(value.get("status")) else []
+    parts += [f"{label}: {details[key]}" for key, label in _ALLOTMENT_DETAILS if _present(details.get(key))]
+    return ", ".join(parts) or None
+
+
+def _section(title: str, rows: List[Tuple[str, object]]) -> List[str]:
+    lines = [f"    - {label}: {value}" for label, value in rows if _present(value)]
+    return [f"  - **{title}:**"] + lines if lines else []
+
+
+def render_listing(doc: Dict) -> str:
+    """
+    One listing as a markdown block, ending with the `---` separator. Fields
+    that are missing from the document are left out rather than guessed.
+    """
+    property_type = str(doc.get("property_type", "")).lower()
+    building = property_type in _BUILDING_TYPES
+    lines = [f"- **{listing_title(doc)}**"]
+    lines += _section("Basic Details", [
+        ("Payment Type", doc.get("payment_type")),
+        ("Price", _price(doc["price"]) if _present(doc.get("price")) else None),
+        ("Installment", doc.get("installment")),
+        ("Monthly Rent", _price(doc["monthly_rent"]) if _present(doc.get("monthly_rent")) else None),
+        ("Building Name", doc.get("building_name") if building else None),
+        ("Commercial Name", doc.get("commercialName") if building else None),
+    ])
+    lines += _section("Location", [
+        ("City", doc.get("city")),
+        ("Phase", doc.get("phase")),
+        ("Sector", doc.get("sector")),
+        ("Pin Location", doc.get("pin_location")),
+    ])
+    lines += _section("Property Specifics", [
+        ("Bedrooms", doc.get("bedrooms")),
+        ("Bathrooms", doc.get("bathrooms")),
+        ("Ownership", doc.get("ownership")),
+        ("Earth Status", doc.get("earth_status")),
+        ("Extra Land", _extra_land(doc.get("extra_land"))),
+        ("Allotment Details", _allotment(doc.get("allotment"))),
+    ])
+    lines += _section("Contact Information", [
+        ("Office Name", doc.get("office_Name")),
+        ("Email", doc.get("email")),
+        ("Contact Number", doc.get("contact_Number")),
+    ])
+    return "\n".join(lines) + "\n\n---\n\n"
+
+
+def render_listings(listings: List[Dict]) -> List[str]:
+    """
+    One rendered block per listing, in order.
+    """
+    return [render_listing(doc) for doc in listings if isinstance(doc, dict)]
+
+
+def split_intro(reply: str) -> Tuple[str, str]:
+    """
+    Split the model's two-line reply into (intro, follow-up question),
+    falling back to the stock sentences for a missing line.
+    """
+    lines = [line.strip() for line in (reply or "").strip().splitlines() if line.strip()]
+    intro = lines[0] if lines else DEFAULT_INTRO
+    follow_up = lines[-1] if len(lines) > 1 else DEFAULT_FOLLOW_UP
+    return intro, follow_up
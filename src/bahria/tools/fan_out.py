@@ -0,0 +1,135 @@
+"""
+Run a `$unionWith` pipeline as concurrent per-collection queries.
+
+The server executes the seven-way union one collection after another. Split
+into one pipeline per collection, the queries run side by side on the shared
+connection pool and their pages are merged as they arrive, so a broad search
+takes about as long as its slowest collection instead of the sum.
+"""
+import os, queue, asyncio, threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple, Callable, Iterator, AsyncIterator
+
+
+# Stages that act on each document independently, so they can be pushed from
+# after the unions into every branch without changing the result.
+_PER_DOCUMENT_STAGES = {"$match", "$project", "$set", "$unset", "$addFields"}
+
+_DONE = object()
+
+
+def split_union_pipeline(collection_name: str, pipeline: List[Dict]) -> Optional[List[Tuple[str, List[Dict]]]]:
+    """
+    Split "stages on the base collection, then one `$unionWith` per other
+    collection, then per-document stages" into [(collection, pipeline), ...],
+    with the trailing stages appended to every branch. Returns None for any
+    other shape (unions with no sub-pipeline are allowed, nested unions and
+    trailing `$sort`/`$group`/`$limit` are not).
+    """
+    if not pipeline:
+        return None
+    first = next((i for i, stage in enumerate(pipeline) if "$unionWith" in stage), None)
+    if first is None:
+        return None
+    head = pipeline[:first]
+    if any("$unionWith" in str(stage) for stage in head):
+        return None
+
+    branches = [(collection_name, list(head))]
+    index = first
+    while index < len(pipeline) and "$unionWith" in pipeline[index]:
+        union = pipeline[index]["$unionWith"]
+        coll, sub = (union, []) if isinstance(union, str) else (union.get("coll"), union.get("pipeline", []))
+        if not isinstance(coll, str) or not isinstance(sub, list) or "$unionWith" in str(sub):
+            return None
+        branches.append((coll, list(sub)))
+        index += 1
+
+    tail = pipeline[index:]
+    if not all(len(stage) == 1 and next(iter(stage)) in _PER_DOCUMENT_STAGES for stage in tail):
+        return None
+    return [(coll, stages + tail) for coll, stages in branches]
+
+
+@lru_cache(maxsize=1)
+def executor() -> ThreadPoolExecutor:
+    # Shared by every session; bounded so a burst of searches can't take
+    # more than MONGO_FAN_OUT_WORKERS pooled connections at once
+    return ThreadPoolExecutor(max_workers=int(os.getenv("MONGO_FAN_OUT_WORKERS", "8")), thread_name_prefix="mongo-fan-out")
+
+
+def merge_concurrently(sources: List[Callable[[], Iterator[List[Dict]]]], max_pending_pages: int = 16) -> Iterator[List[Dict]]:
+    """
+    Run each page iterator factory in `sources` on the shared executor and
+    yield pages in the order they arrive. The first error is re-raised here;
+    closing the generator early stops the remaining branches at their next page.
+    """
+    pages: "queue.Queue" = queue.Queue(maxsize=max_pending_pages)
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(source):
+        try:
+            for page in source():
+                if stop.is_set():
+                    break
+                _put(page)
+        except Exception as e:
+            _put(e)
+        finally:
+            _put(_DONE)
+
+    for source in sources:
+        executor().submit(_run, source)
+    remaining = len(sources)
+    try:
+        while remaining:
+            item = pages.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+async def amerge_concurrently(sources: List[Callable[[], AsyncIterator[List[Dict]]]], max_pending_pages: int = 16) -> AsyncIterator[List[Dict]]:
+    """
+    asyncio counterpart of `merge_concurrently`: one task per source on the
+    running event loop, pages yielded in the order they arrive.
+    """
+    pages: "asyncio.Queue" = asyncio.Queue(maxsize=max_pending_pages)
+
+    async def _run(source):
+        try:
+            async for page in source():
+                await pages.put(page)
+        except Exception as e:
+            await pages.put(e)
+        finally:
+            await pages.put(_DONE)
+
+    tasks = [asyncio.ensure_future(_run(source)) for source in sources]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            item = await pages.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,204 @@
+"""
+Index advisor and bootstrap for the property listing collections.
+
+Every search matches `society` with a case-insensitive `$regex`, which can't use
+a normal index. This module adds lowercase `city_norm` / `society_norm` copies of
+those fields, indexes them together with the other fields searches filter on,
+and rewrites incoming case-insensitive regex matches onto the normalized fields
+when the rewrite is equivalent.
+
+Run from `src/bahria`:
+    python -m tools.index_advisor advise
+    python -m tools.index_advisor bootstrap [--dry-run]
+
+Listings are written outside this app, so documents inserted after the last
+`bootstrap` have no normalized fields. `MongoTool` therefore rewrites with
+`fallback=True`: such documents are still matched on the original regex, at
+the cost of an extra index range per field. Re-run `bootstrap` (it is
+idempotent) after bulk imports so new documents get index-only matches again,
+and after listings change their city or society, which the fallback can't
+detect.
+"""
+import re, json, argparse
+from typing import Optional, List, Dict, Tuple
+
+from tools.query_compiler import PROPERTY_COLLECTIONS
+
+
+# Source field -> lowercase copy maintained by `bootstrap`
+NORMALIZED_FIELDS: Dict[str, str] = {
+    "city": "city_norm",
+    "society": "society_norm",
+}
+
+# Indexes every listing collection should have
+RECOMMENDED_INDEXES: List[List[Tuple[str, int]]] = [
+    [("city", 1), ("society_norm", 1), ("property_type", 1), ("list_type", 1)],
+    [("city_norm", 1), ("society_norm", 1)],
+]
+
+
+def _index_name(keys: List[Tuple[str, int]]) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+# ------------------------------
+# Query Rewriting
+# ------------------------------
+_ESCAPED_OR_PLAIN = re.compile(r"(?:\\[.^$*+?{}\[\]\\|()/ -]|[^.^$*+?{}\[\]\\|()])*")
+
+
+def _literal(pattern: str) -> Optional[str]:
+    """
+    Return the literal text a regex matches if it has no regex semantics
+    beyond escaped characters, else None.
+    """
+    if not _ESCAPED_OR_PLAIN.fullmatch(pattern):
+        return None
+    return re.sub(r"\\(.)", r"\1", pattern)
+
+
+def rewrite_regex_condition(condition) -> Optional[Dict]:
+    """
+    Rewrite a `{"$regex": ..., "$options": "i"}` condition into an equivalent
+    condition on the lowercase normalized field:
+      - "^text$" becomes an equality match
+      - "^text" becomes a case-sensitive prefix regex (uses index bounds)
+      - "text" or "a|b" becomes a case-sensitive regex (scans index keys only)
+    Returns None if the condition isn't a case-insensitive literal regex.
+    """
+    if not isinstance(condition, dict) or set(condition) != {"$regex", "$options"}:
+        return None
+    if condition["$options"] != "i" or not isinstance(condition["$regex"], str):
+        return None
+
+    pattern = condition["$regex"]
+    anchored_start = pattern.startswith("^")
+    anchored_end = pattern.endswith("$") and not pattern.endswith("\\$")
+    body = pattern[1 if anchored_start else 0:len(pattern) - (1 if anchored_end else 0)]
+
+    if anchored_start or anchored_end:
+        literal = _literal(body)
+        if literal is None:
+            return None
+        if anchored_start and anchored_end:
+            return {"$eq": literal.lower()}
+        return {"$regex": pattern.lower()}
+
+    # Unanchored alternation of literals
+    alternatives = re.split(r"(?<!\\)\|", body)
+    if any(_literal(alt) is None or not alt for alt in alternatives):
+        return None
+    return {"$regex": body.lower()}
+
+
+def rewrite_match(match: Dict, fallback: bool = False) -> Dict:
+    """
+    Return a copy of a `$match` body with case-insensitive literal regexes on
+    `city`/`society` moved onto their normalized fields. Other conditions are
+    kept as they are. With `fallback`, documents that don't have the
+    normalized field yet are matched on the original condition instead:
+
+        {"$or": [{"society_norm": ...}, {"society_norm": {"$exists": False}, "society": <regex>}]}
+    """
+    rewritten, alternatives = {}, []
+    for field, condition in match.items():
+        norm_field = NORMALIZED_FIELDS.get(field)
+        new_condition = rewrite_regex_condition(condition) if norm_field else None
+        if new_condition is None or norm_field in match:
+            rewritten[field] = condition
+            continue
+        new_condition = new_condition["$eq"] if "$eq" in new_condition else new_condition
+        if fallback:
+            alternatives.append([{norm_field: new_condition}, {norm_field: {"$exists": False}, field: condition}])
+        else:
+            rewritten[norm_field] = new_condition
+    if len(alternatives) == 1 and "$or" not in rewritten:
+        rewritten["$or"] = alternatives[0]
+    elif alternatives:
+        rewritten["$and"] = rewritten.get("$and", []) + [{"$or": branches} for branches in alternatives]
+    return rewritten
+
+
+def rewrite_pipeline(pipeline: List[Dict], fallback: bool = False) -> List[Dict]:
+    """
+    Apply `rewrite_match` to every `$match` stage, including the ones inside
+    `$unionWith` sub-pipelines.
+    """
+    rewritten = []
+    for stage in pipeline:
+        if "$match" in stage and isinstance(stage["$match"], dict):
+            stage = {**stage, "$match": rewrite_match(stage["$match"], fallback)}
+        elif isinstance(stage.get("$unionWith"), dict) and isinstance(stage["$unionWith"].get("pipeline"), list):
+            union = stage["$unionWith"]
+            stage = {**stage, "$unionWith": {**union, "pipeline": rewrite_pipeline(union["pipeline"], fallback)}}
+        rewritten.append(stage)
+    return rewritten
+
+
+# ------------------------------
+# Advisor / Bootstrap
+# ------------------------------
+def advise(database, collections: List[str] = PROPERTY_COLLECTIONS) -> List[Dict]:
+    """
+    Inspect each collection and report missing recommended indexes and how
+    many documents still lack normalized fields.
+    """
+    report = []
+    for name in collections:
+        col = database[name]
+        existing = [[tuple(key) for key in info["key"]] for info in col.index_information().values()]
+        missing = [_index_name(keys) for keys in RECOMMENDED_INDEXES if keys not in existing]
+        unnormalized = col.count_documents({"$or": [{norm: {"$exists": False}} for norm in NORMALIZED_FIELDS.values()]})
+        report.append({
+            "collection": name,
+            "documents": col.estimated_document_count(),
+            "missing_indexes": missing,
+            "documents_missing_normalized_fields": unnormalized,
+        })
+    return report
+
+
+def bootstrap(database, collections: List[str] = PROPERTY_COLLECTIONS, dry_run: bool = False) -> List[Dict]:
+    """
+    Backfill the normalized fields and create the recommended indexes.
+    Safe to re-run.
+    """
+    normalize = [{"$set": {
+        norm: {"$toLower": {"$ifNull": [f"${field}", ""]}}
+        for field, norm in NORMALIZED_FIELDS.items()
+    }}]
+    results = []
+    for name in collections:
+        col = database[name]
+        result = {"collection": name, "normalized": 0, "created_indexes": []}
+        if not dry_run:
+            result["normalized"] = col.update_many({}, normalize).modified_count
+        for keys in RECOMMENDED_INDEXES:
+            index_name = _index_name(keys)
+            if not dry_run:
+                col.create_index(keys, name=index_name)
+            result["created_indexes"].append(index_name)
+        results.append(result)
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Propose and create indexes for the property collections.")
+    parser.add_argument("command", choices=["advise", "bootstrap"])
+    parser.add_argument("--collections", nargs="+", default=PROPERTY_COLLECTIONS)
+    parser.add_argument("--dry-run", action="store_true", help="Show what bootstrap would do without writing.")
+    args = parser.parse_args(argv)
+
+    from tools.mongo_client import get_db
+    db = get_db()
+
+    if args.command == "advise":
+        output = advise(db, args.collections)
+    else:
+        output = bootstrap(db, args.collections, dry_run=args.dry_run)
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
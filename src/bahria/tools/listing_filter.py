@@ -0,0 +1,213 @@
+import re
+from typing import Optional, List, Dict, Tuple, Union, Callable
+
+from tools.query_compiler import PROPERTY_TYPE_ALIASES, _find_terms
+
+
+# ------------------------------
+# Vocabulary
+# ------------------------------
+# PROPERTY_TYPE_ALIASES key -> `property_type` values stored in the listings
+PROPERTY_TYPE_VALUES: Dict[str, List[str]] = {
+    "apartment": ["apartment"],
+    "home": ["home"],
+    "shop": ["shop"],
+    "commercial plot": ["commercial plot"],
+    "farmhouse": ["farmhouse"],
+    "residential plot": ["residential plot"],
+    "plot": ["residential plot", "commercial plot"],
+    "plaza": ["plaza"],
+}
+
+# Size units -> (canonical unit, factor to marla). Square feet are kept apart:
+# the marla is 225 or 272.25 sq ft depending on the society.
+SIZE_UNITS: Dict[str, Tuple[str, float]] = {
+    "marla": ("marla", 1),
+    "kanal": ("marla", 20),
+    "sq ft": ("sq ft", 1),
+    "sq. ft": ("sq ft", 1),
+    "sqft": ("sq ft", 1),
+    "square feet": ("sq ft", 1),
+    "square foot": ("sq ft", 1),
+}
+
+PRICE_UNITS: Dict[str, float] = {
+    "arab": 1e9,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "million": 1e6, "millions": 1e6, "mn": 1e6,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "thousand": 1e3, "k": 1e3,
+}
+
+_NUMBER = r"(\d+(?:[.,]\d+)*)"
+_LESS = r"(?:less than|under|below|upto|up to|max(?:imum)?|within|not more than)"
+_MORE = r"(?:more than|greater than|above|over|at least|min(?:imum)?|bigger than|larger than)"
+_SIZE_UNIT = r"(marla|kanal|sq\.?\s*ft|sqft|square f(?:ee|oo)t)s?"
+_PRICE_UNIT = r"(arab|crores?|cr|millions?|mn|lakhs?|lacs?|thousand|k)\b"
+
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def _size_unit(text: str) -> Tuple[str, float]:
+    text = re.sub(r"\s+", " ", text.lower().rstrip("s"))
+    text = "sq ft" if text.startswith("sq") else text
+    return SIZE_UNITS.get(text, (text, 1))
+
+
+def _amount(number: str, unit: Optional[str]) -> float:
+    return _number(number) * (PRICE_UNITS.get(unit.lower(), 1) if unit else 1)
+
+
+def extract_filters(property_details: Union[str, Dict, None]) -> Dict:
+    """
+    Pull the structured constraints the summary prompt asks the model to
+    honour out of `property_details`: property types, list type, size (exact
+    or a range), bedrooms, phase and a price range. Keys are only present
+    for constraints that were found. Accepts the one-line summary or an
+    analysis dict carrying "property_details".
+    """
+    if isinstance(property_details, dict):
+        property_details = property_details.get("property_details", "")
+    text = str(property_details or "").lower()
+    filters: Dict = {}
+    if not text:
+        return filters
+
+    types = [value for key in _find_terms(text, PROPERTY_TYPE_ALIASES) for value in PROPERTY_TYPE_VALUES.get(key, [])]
+    if types:
+        filters["property_type"] = sorted(set(types))
+
+    wants_rent = re.search(r"\b(rent|rental|lease)\b", text) is not None
+    wants_sale = re.search(r"\b(sale|buy|buying|purchase)\b", text) is not None
+    if wants_rent != wants_sale:
+        filters["list_type"] = "rent" if wants_rent else "sale"
+
+    size = re.search(rf"(?:({_LESS}|{_MORE})\s+)?{_NUMBER}\s*{_SIZE_UNIT}", text)
+    if size:
+        comparator, value, unit = size.groups()
+        unit, factor = _size_unit(unit)
+        value = _number(value) * factor
+        if comparator and re.fullmatch(_LESS, comparator):
+            filters["size"] = {"unit": unit, "max": value}
+        elif comparator:
+            filters["size"] = {"unit": unit, "min": value}
+        else:
+            filters["size"] = {"unit": unit, "min": value, "max": value}
+
+    bedrooms = re.search(r"\b(\d+)\s*(?:-\s*)?(?:bed(?:room)?s?|bhk)\b", text)
+    if bedrooms:
+        filters["bedrooms"] = int(bedrooms.group(1))
+
+    phase = re.search(r"\bphase\s*[-#]?\s*(\d+[a-z]?|[ivx]+)\b", text)
+    if phase:
+        filters["phase"] = f"phase {phase.group(1)}"
+
+    price = _extract_price(text)
+    if price:
+        filters["price"] = price
+    return filters
+
+
+def _extract_price(text: str) -> Optional[Dict[str, float]]:
+    # An amount needs a price unit or a currency marker, so sizes and
+    # bedroom counts are never read as prices.
+    amount = rf"(?:pkr|rs\.?)?\s*{_NUMBER}\s*(?:{_PRICE_UNIT})?"
+    between = re.search(rf"between\s+{amount}\s+(?:and|to|-)\s+{amount}", text)
+    if between:
+        low_number, low_unit, high_number, high_unit = between.groups()
+        if low_unit or high_unit:
+            # "between 50 and 80 lakh" shares the second unit
+            low = _amount(low_number, low_unit or high_unit)
+            high = _amount(high_number, high_unit or low_unit)
+            return {"min": min(low, high), "max": max(low, high)}
+
+    price = {}
+    for comparator, key in ((_LESS, "max"), (_MORE, "min")):
+        match = re.search(rf"{comparator}\s+(?:(pkr|rs\.?)\s*)?{_NUMBER}\s*(?:{_PRICE_UNIT})?", text)
+        if match and (match.group(1) or match.group(3)):
+            price[key] = _amount(match.group(2), match.group(3))
+    return price or None
+
+
+# ------------------------------
+# Filtering
+# ------------------------------
+def _norm(value) -> Optional[str]:
+    return re.sub(r"\s+", " ", value).strip().lower() if isinstance(value, str) else None
+
+
+def _num(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _compile_checks(filters: Dict) -> List[Callable[[Dict], bool]]:
+    # One check per active constraint, cheapest and most selective first
+    checks: List[Callable[[Dict], bool]] = []
+    if "property_type" in filters:
+        types = frozenset(filters["property_type"])
+        checks.append(lambda doc: _norm(doc.get("property_type")) in types)
+    if "list_type" in filters:
+        list_type = filters["list_type"]
+        checks.append(lambda doc: _norm(doc.get("list_type")) == list_type)
+    if "phase" in filters:
+        phase = filters["phase"]
+        checks.append(lambda doc: _norm(doc.get("phase")) == phase)
+    if "bedrooms" in filters:
+        bedrooms = filters["bedrooms"]
+        checks.append(lambda doc: _num(doc.get("bedrooms")) == bedrooms)
+    if "size" in filters:
+        size = filters["size"]
+        size_min, size_max = size.get("min", float("-inf")), size.get("max", float("inf"))
+
+        def size_check(doc):
+            value = doc.get("size")
+            if not isinstance(value, dict) or not isinstance(value.get("unit"), str):
+                return False
+            unit, factor = _size_unit(value["unit"])
+            number = _num(value.get("value"))
+            return unit == size["unit"] and number is not None and size_min <= number * factor <= size_max
+        checks.append(size_check)
+    if "price" in filters:
+        price_min, price_max = filters["price"].get("min", float("-inf")), filters["price"].get("max", float("inf"))
+
+        def price_check(doc):
+            # Rentals (shops, plazas) quote the rent in `monthly_rent`
+            price = _num(doc.get("monthly_rent")) if _norm(doc.get("list_type")) == "rent" else None
+            price = price if price is not None else _num(doc.get("price"))
+            return price is not None and price_min <= price <= price_max
+        checks.append(price_check)
+    return checks
+
+
+def compile_predicate(filters: Dict) -> Callable[[Dict], bool]:
+    """
+    Turn `filters` into one predicate over a listing. Each active constraint
+    becomes a small check, ordered cheapest and most selective first, so a
+    listing is rejected on its first failing field.
+    """
+    checks = _compile_checks(filters)
+    return lambda doc: all(check(doc) for check in checks)
+
+
+def filter_listings(listings: List[Dict], filters: Dict) -> List[Dict]:
+    """
+    Return the listings that satisfy every filter, in their original order.
+    """
+    if not filters or not listings:
+        return listings
+    predicate = compile_predicate(filters)
+    return [doc for doc in listings if predicate(doc)]
+
+
+def closest_listings(listings: List[Dict], filters: Dict, limit: int) -> List[Dict]:
+    """
+    The `limit` listings that satisfy the most filters, best first (ties keep
+    their original order), to show as alternatives when none satisfies all.
+    """
+    checks = _compile_checks(filters)
+    return sorted(listings, key=lambda doc: -sum(check(doc) for check in checks))[:limit]
@@ -0,0 +1,200 @@
+"""
+Materialized `all_listings` collection: one document per listing from every
+property collection, with the normalized fields searches filter on.
+
+Searches against it are a single indexed `$match` instead of the seven-way
+`$unionWith` fan-out. Keep it current on a schedule or from change streams.
+Run from `src/bahria`:
+    python -m tools.listings_view refresh [--every SECONDS]
+    python -m tools.listings_view watch
+    python -m tools.listings_view check [--sample 20]
+"""
+import json, time, argparse
+from datetime import datetime, timezone
+from typing import Optional, List, Dict
+
+from tools.query_compiler import PROPERTY_COLLECTIONS
+from tools.index_advisor import NORMALIZED_FIELDS, rewrite_match
+
+
+LISTINGS_VIEW = "all_listings"
+
+# Fields the view adds on top of each source document
+VIEW_FIELDS = ["source_collection", "source_id", "refreshed_at"] + list(NORMALIZED_FIELDS.values())
+
+VIEW_INDEXES = [
+    [("city", 1), ("society_norm", 1), ("property_type", 1), ("list_type", 1)],
+    [("source_collection", 1), ("refreshed_at", 1)],
+]
+
+
+def _view_fields(coll: str, refreshed_at) -> Dict:
+    fields = {
+        "source_collection": coll,
+        "source_id": "$_id",
+        "refreshed_at": refreshed_at,
+    }
+    for field, norm in NORMALIZED_FIELDS.items():
+        fields[norm] = {"$toLower": {"$ifNull": [f"${field}", ""]}}
+    return fields
+
+
+def _view_document(coll: str, doc: Dict, refreshed_at) -> Dict:
+    """
+    Python counterpart of `_view_fields`, used for change-stream updates.
+    """
+    view_doc = dict(doc)
+    view_doc.update({
+        "_id": {"c": coll, "i": doc["_id"]},
+        "source_collection": coll,
+        "source_id": doc["_id"],
+        "refreshed_at": refreshed_at,
+    })
+    for field, norm in NORMALIZED_FIELDS.items():
+        value = doc.get(field)
+        view_doc[norm] = value.lower() if isinstance(value, str) else ""
+    return view_doc
+
+
+# ------------------------------
+# Maintenance
+# ------------------------------
+def ensure_indexes(database):
+    view = database[LISTINGS_VIEW]
+    for keys in VIEW_INDEXES:
+        view.create_index(keys)
+
+
+def refresh(database, collections: List[str] = PROPERTY_COLLECTIONS) -> Dict[str, int]:
+    """
+    Rebuild the view with `$merge` from every source collection, then drop
+    view documents whose source listing no longer exists.
+    """
+    ensure_indexes(database)
+    refreshed_at = datetime.now(timezone.utc)
+    removed = {}
+    for coll in collections:
+        database[coll].aggregate([
+            {"$set": _view_fields(coll, refreshed_at)},
+            {"$set": {"_id": {"c": coll, "i": "$_id"}}},
+            {"$merge": {"into": LISTINGS_VIEW, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ])
+        stale = database[LISTINGS_VIEW].delete_many({"source_collection": coll, "refreshed_at": {"$lt": refreshed_at}})
+        removed[coll] = stale.deleted_count
+    return removed
+
+
+def watch_and_sync(database, collections: List[str] = PROPERTY_COLLECTIONS):
+    """
+    Apply inserts, updates and deletes on the source collections to the view
+    as they happen. Blocks; needs a replica set / Atlas.
+    """
+    view = database[LISTINGS_VIEW]
+    pipeline = [{"$match": {"ns.coll": {"$in": collections}}}]
+    with database.watch(pipeline, full_document="updateLookup") as changes:
+        for change in changes:
+            coll = change["ns"]["coll"]
+            view_id = {"c": coll, "i": change["documentKey"]["_id"]}
+            doc = change.get("fullDocument")
+            if change["operationType"] == "delete" or doc is None:
+                view.delete_one({"_id": view_id})
+            else:
+                view.replace_one({"_id": view_id}, _view_document(coll, doc, datetime.now(timezone.utc)), upsert=True)
+
+
+def check_consistency(database, collections: List[str] = PROPERTY_COLLECTIONS, sample_size: int = 20) -> Dict:
+    """
+    Compare per-collection counts and a random sample of documents between the
+    source collections and the view.
+    """
+    view = database[LISTINGS_VIEW]
+    report = {"consistent": True, "collections": []}
+    for coll in collections:
+        source_count = database[coll].estimated_document_count()
+        view_count = view.count_documents({"source_collection": coll})
+        mismatched = []
+        for doc in database[coll].aggregate([{"$sample": {"size": sample_size}}]):
+            view_doc = view.find_one({"_id": {"c": coll, "i": doc["_id"]}})
+            if view_doc is None:
+                mismatched.append(str(doc["_id"]))
+                continue
+            view_doc = {k: v for k, v in view_doc.items() if k not in VIEW_FIELDS and k != "_id"}
+            source_doc = {k: v for k, v in doc.items() if k not in VIEW_FIELDS and k != "_id"}
+            if view_doc != source_doc:
+                mismatched.append(str(doc["_id"]))
+        ok = source_count == view_count and not mismatched
+        report["consistent"] = report["consistent"] and ok
+        report["collections"].append({
+            "collection": coll,
+            "source_count": source_count,
+            "view_count": view_count,
+            "mismatched_sample_ids": mismatched,
+        })
+    return report
+
+
+# ------------------------------
+# Query Rewriting
+# ------------------------------
+def collapse_union_pipeline(collection_name: str, pipeline: List[Dict]) -> Optional[List[Dict]]:
+    """
+    Turn the canonical "`$match` then one `$unionWith` per property collection"
+    pipeline into a single-`$match` pipeline over the view. Stages after the
+    unions are kept. Returns None for any other pipeline shape.
+    """
+    if not pipeline or "$match" not in pipeline[0] or collection_name not in PROPERTY_COLLECTIONS:
+        return None
+    match = pipeline[0]["$match"]
+    collections = [collection_name]
+
+    index = 1
+    while index < len(pipeline) and "$unionWith" in pipeline[index]:
+        union = pipeline[index]["$unionWith"]
+        if not isinstance(union, dict) or union.get("coll") not in PROPERTY_COLLECTIONS:
+            return None
+        if union.get("pipeline") != [{"$match": match}]:
+            return None
+        if union["coll"] not in collections:
+            collections.append(union["coll"])
+        index += 1
+    if index == 1:
+        return None
+
+    view_match = rewrite_match(match)
+    if set(collections) != set(PROPERTY_COLLECTIONS):
+        view_match["source_collection"] = {"$in": collections}
+    return [
+        {"$match": view_match},
+        # Present documents the way the source collections would
+        {"$set": {"_id": "$source_id"}},
+        {"$unset": ["source_id", "refreshed_at"] + list(NORMALIZED_FIELDS.values())},
+    ] + pipeline[index:]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain the all_listings collection.")
+    parser.add_argument("command", choices=["refresh", "watch", "check"])
+    parser.add_argument("--every", type=float, default=0, help="Refresh again every N seconds.")
+    parser.add_argument("--sample", type=int, default=20, help="Documents sampled per collection by `check`.")
+    args = parser.parse_args(argv)
+
+    from tools.mongo_client import get_db
+    db = get_db()
+
+    if args.command == "refresh":
+        while True:
+            print(json.dumps({"removed_stale": refresh(db)}, indent=2))
+            if not args.every:
+                break
+            time.sleep(args.every)
+    elif args.command == "watch":
+        watch_and_sync(db)
+    else:
+        report = check_consistency(db, sample_size=args.sample)
+        print(json.dumps(report, indent=2))
+        if not report["consistent"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os, threading
+from typing import Optional, Dict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class MongoClientManager:
+    """
+    One MongoDB client per process, created on first use instead of at import
+    so turns that never search don't pay for DNS/SRV resolution or server
+    selection. pymongo clients are thread-safe and pool connections, so every
+    MongoTool and Streamlit session shares the same warm pool; `max_pool_size`
+    bounds concurrent operations and `wait_queue_timeout_ms` makes a saturated
+    pool fail fast instead of queueing requests behind each other.
+    """
+
+    def __init__(
+        self,
+        uri: Optional[str],
+        db_name: Optional[str],
+        max_pool_size: int = 50,
+        min_pool_size: int = 0,
+        max_idle_time_ms: int = 300000,
+        server_selection_timeout_ms: int = 5000,
+        connect_timeout_ms: int = 5000,
+        wait_queue_timeout_ms: int = 10000,
+        max_time_ms: int = 15000,
+    ):
+        self.uri = uri
+        self.db_name = db_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.max_idle_time_ms = max_idle_time_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.connect_timeout_ms = connect_timeout_ms
+        self.wait_queue_timeout_ms = wait_queue_timeout_ms
+        # Per-operation server time limit passed to find()/aggregate()
+        self.max_time_ms = max_time_ms
+        self._client = None
+        self._async_client = None
+        self._db = None
+        self._lock = threading.Lock()
+
+    def client_options(self) -> Dict:
+        from pymongo.server_api import ServerApi
+
+        return {
+            "server_api": ServerApi("1"),
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "appname": "bahria",
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import pymongo
+
+                    self._client = pymongo.MongoClient(self.uri, **self.client_options())
+        return self._client
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self.client[self.db_name]
+        return self._db
+
+    @property
+    def async_client(self):
+        """
+        The asyncio client: pymongo's AsyncMongoClient (pymongo >= 4.10), or
+        Motor on older installs. Raises ImportError if neither is available.
+        """
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    try:
+                        from pymongo import AsyncMongoClient
+                    except ImportError:
+                        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+                    self._async_client = AsyncMongoClient(self.uri, **self.client_options())
+        return self._async_client
+
+    @property
+    def async_db(self):
+        return self.async_client[self.db_name]
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = self._db = None
+            # The async client is closed by its owner's event loop; just drop it
+            self._async_client = None
+
+
+mongo = MongoClientManager(
+    uri=os.getenv("MONGODB_URI"),
+    db_name=os.getenv("DB_NAME"),
+    max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    min_pool_size=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    max_idle_time_ms=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    server_selection_timeout_ms=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    connect_timeout_ms=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    wait_queue_timeout_ms=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+    max_time_ms=int(os.getenv("MONGO_MAX_TIME_MS", "15000")),
+)
+
+
+def get_db():
+    """
+    The shared database handle, connecting on first use.
+    """
+    return mongo.db
@@ -1,19 +1,199 @@
-import os, re, json
-from typing import Optional, List, Dict, Type
+import os, re, json, time, inspect, threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Type, Iterable, Iterator, AsyncIterator, Tuple
 from pydantic import BaseModel, Field
 from pydantic import model_validator
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
-from bson.json_util import dumps
+from bson.json_util import dumps, loads
 from dotenv import load_dotenv
 from crewai.tools import BaseTool
+from tools.query_compiler import PROPERTY_COLLECTIONS
+from tools.index_advisor import rewrite_match, rewrite_pipeline
+from tools.listings_view import LISTINGS_VIEW, collapse_union_pipeline
+from tools.payload import SUMMARY_PROJECTION, project_pipeline, compact_dumps
+from tools.mongo_client import mongo, get_db
+from tools.pagination import keyset_pipeline
+from tools.query_guard import query_guard
+from tools.fan_out import split_union_pipeline, merge_concurrently, amerge_concurrently
+from tracing import tracer
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB client setup
-client = MongoClient(os.getenv("MONGODB_URI"),server_api=ServerApi('1'))
-db = client[os.getenv("DB_NAME")]
+# Streaming defaults: documents per cursor batch and the server-side cap on
+# documents returned per query (0 disables the cap).
+DEFAULT_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "100"))
+DEFAULT_MAX_DOCUMENTS = int(os.getenv("MONGO_MAX_DOCUMENTS", "500"))
+
+# Rewrite case-insensitive society/city regexes onto the indexed lowercase
+# fields. Only enable after `python -m tools.index_advisor bootstrap`; listings
+# inserted since then lack the fields and are matched on the original regex
+# (see tools/index_advisor.py), so re-run bootstrap after bulk imports.
+USE_NORMALIZED_FIELDS = os.getenv("MONGO_USE_NORMALIZED_FIELDS", "false").lower() == "true"
+
+# Answer canonical union searches from the materialized `all_listings`
+# collection. Only enable once `python -m tools.listings_view refresh` has run.
+USE_LISTINGS_VIEW = os.getenv("MONGO_USE_LISTINGS_VIEW", "false").lower() == "true"
+
+# Return only the fields the summary format uses (see tools/payload.py)
+PROJECT_SUMMARY_FIELDS = os.getenv("MONGO_PROJECT_SUMMARY_FIELDS", "true").lower() == "true"
+
+# Run `$unionWith` pipelines as concurrent per-collection queries (see
+# tools/fan_out.py). Each search then takes up to eight pooled connections.
+FAN_OUT = os.getenv("MONGO_FAN_OUT", "false").lower() == "true"
+
+NO_DATA_MESSAGE = "No properties found matching your criteria."
+
+
+def encode_json_chunks(pages: Iterable[List[Dict]]) -> Iterator[str]:
+    """
+    Incrementally encode pages of documents as one JSON array, yielding one
+    string chunk per page. Yields NO_DATA_MESSAGE if there were no documents.
+    """
+    started = False
+    for page in pages:
+        if not page:
+            continue
+        body = ",".join(compact_dumps(doc) for doc in page)
+        if not started:
+            started = True
+            yield "[" + body
+        else:
+            yield "," + body
+    yield "]" if started else NO_DATA_MESSAGE
+
+
+# ------------------------------
+# Result Cache
+# ------------------------------
+class ResultCache:
+    """
+    LRU + TTL cache of serialized query results, keyed by the canonical form of
+    the collection and filter/pipeline. Eviction is bounded by total bytes.
+    `invalidate()` bumps a version counter and drops every entry; it is called
+    by the change-stream watcher when any listing collection changes.
+    """
+
+    def __init__(self, ttl_seconds: float, max_bytes: int, max_entry_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def make_key(collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], *extra) -> str:
+        """
+        Canonicalize a query: object keys are sorted at every depth (stage
+        order is kept), and BSON types are encoded via json_util.
+        """
+        return dumps({"collection": collection_name, "filter": filter, "pipeline": pipeline, "extra": list(extra)}, sort_keys=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """
+        Return (payload, document_count) for a live entry, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, payload, count = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload, count
+
+    def put(self, key: str, payload: str, count: int, version: int):
+        """
+        Store a payload unless it is too large, or the cache was invalidated
+        since the query started (`version` is the version read before the query).
+        """
+        size = len(payload)
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, payload, count)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        _, payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "version": self.version,
+            }
+
+    def watch(self, database, collections: List[str]):
+        """
+        Start (once) a daemon thread that invalidates the cache whenever one of
+        `collections` changes. Needs a replica set / Atlas; if the change stream
+        can't be opened or stops, nothing would invalidate the cache any more,
+        so it is emptied and turned off.
+        """
+        if self._watcher is not None:
+            return
+
+        def _watch():
+            try:
+                with database.watch([{"$match": {"ns.coll": {"$in": collections}}}]) as changes:
+                    for _ in changes:
+                        self.invalidate()
+            except Exception as e:
+                print(f"[Info] Result cache change stream stopped, disabling the cache: {str(e)}")
+            self.ttl_seconds = 0
+            self.invalidate()
+
+        self._watcher = threading.Thread(target=_watch, name="mongo-result-cache-watch", daemon=True)
+        self._watcher.start()
+
+
+# Listings are written outside this app, so without the change-stream
+# invalidation a cached result can be up to a TTL stale; the cache is
+# therefore off unless MONGO_CACHE_WATCH or an explicit TTL turns it on.
+CACHE_WATCH_CHANGES = os.getenv("MONGO_CACHE_WATCH", "false").lower() == "true"
+
+result_cache = ResultCache(
+    ttl_seconds=float(os.getenv("MONGO_CACHE_TTL_SECONDS", "300" if CACHE_WATCH_CHANGES else "0")),
+    max_bytes=int(os.getenv("MONGO_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    max_entry_bytes=int(os.getenv("MONGO_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024))),
+)
+tracer.add_gauge("result_cache", result_cache.stats)
 
 
 # ------------------------------
@@ -43,6 +223,14 @@ class MongoTool(BaseTool):
     )
     args_schema: Type[BaseModel] = MongoToolInput
     last_output: Optional[str] = None
+    last_count: int = 0
+    batch_size: int = DEFAULT_BATCH_SIZE
+    max_documents: int = DEFAULT_MAX_DOCUMENTS
+    use_cache: bool = True
+    use_normalized_fields: bool = USE_NORMALIZED_FIELDS
+    use_listings_view: bool = USE_LISTINGS_VIEW
+    project_summary_fields: bool = PROJECT_SUMMARY_FIELDS
+    fan_out: bool = FAN_OUT
 
     def _extract_json_from_string(self, raw_str: str):
         """
@@ -62,77 +250,420 @@ class MongoTool(BaseTool):
         json_str = next(g for g in match.groups() if g)
         return json.loads(json_str)
 
-    def _run(
+    def _parse_query(self, filter, pipeline, collection_hint):
+        """
+        Normalize LLM-provided filter/pipeline input, resolve the collection
+        and check the query with `query_guard`. Returns (collection_name,
+        filter, pipeline) or raises ValueError with a user-facing error message.
+        """
+        # Clean and parse filter if it is a string (from LLM)
+        if filter and isinstance(filter, str):
+            try:
+                filter = self._extract_json_from_string(filter)
+            except ValueError as e:
+                raise ValueError(f"Error parsing filter JSON: {str(e)}")
+
+        # Clean and parse pipeline if it is a string (from LLM)
+        if pipeline and isinstance(pipeline, str):
+            try:
+                pipeline = self._extract_json_from_string(pipeline)
+            except ValueError as e:
+                raise ValueError(f"Error parsing pipeline JSON: {str(e)}")
+
+        if filter:
+            filter = dict(filter)
+            collection_name = filter.pop("_collection", None) or collection_hint
+            if not collection_name:
+                raise ValueError("Error: Collection name not found. Provide '_collection' in filter or set 'collection_hint'.")
+            query_guard.check(filter, None)
+            return collection_name, filter, None
+
+        elif pipeline:
+            if not isinstance(pipeline, list) or not pipeline:
+                raise ValueError("Error: Pipeline must be a non-empty list of stages.")
+
+            # Attempt to auto-detect base collection
+            collection_name = collection_hint #pipeline[0].get("_collection") or collection_hint
+            if not collection_name:
+                # Check for any $unionWith stage and use its first coll if nothing else
+                for stage in pipeline:
+                    if "$unionWith" in stage:
+                        union_stage = stage["$unionWith"]
+                        if isinstance(union_stage, dict) and "coll" in union_stage:
+                            collection_name = union_stage["coll"]
+                        elif isinstance(union_stage, str):
+                            collection_name = union_stage
+                        break
+
+                # If no $unionWith found, default to error
+                if not collection_name:
+                    raise ValueError("Error: Base collection not found. Provide 'collection_hint' or ensure pipeline includes $unionWith with 'coll'.")
+
+                print(f"[Info] Auto-detected base collection: {collection_name}")
+            query_guard.check(None, pipeline)
+            return collection_name, None, pipeline
+
+        raise ValueError("Error: Neither 'filter' nor 'pipeline' provided.")
+
+    def _optimize(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], keep_id: bool = False):
+        """
+        Rewrite a parsed query into an equivalent, cheaper one before it runs.
+        `keep_id` keeps `_id` in the projected documents (for pagination).
+        Returns (collection_name, filter, pipeline).
+        """
+        collapsed = None
+        if self.use_listings_view and pipeline is not None:
+            collapsed = collapse_union_pipeline(collection_name, pipeline)
+        if collapsed is not None:
+            collection_name, pipeline = LISTINGS_VIEW, collapsed
+        elif self.use_normalized_fields:
+            if filter is not None:
+                filter = rewrite_match(filter, fallback=True)
+            if pipeline is not None:
+                pipeline = rewrite_pipeline(pipeline, fallback=True)
+        if self.project_summary_fields and pipeline is not None:
+            pipeline = project_pipeline(pipeline, {**SUMMARY_PROJECTION, "_id": 1} if keep_id else SUMMARY_PROJECTION)
+        return collection_name, filter, pipeline
+
+    def _open_cursor(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int):
+        """
+        Open a server-side cursor, capped at `max_documents` on the server.
+        """
+        return self._cursor_for(get_db()[collection_name], filter, pipeline, batch_size)
+
+    def _cursor_for(self, col, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int):
+        # Shared by the sync and async paths; an async aggregate() may return
+        # an awaitable that resolves to the cursor.
+        if filter is not None:
+            projection = dict(SUMMARY_PROJECTION) if self.project_summary_fields else {"_id": 0}
+            cursor = col.find(filter, projection, batch_size=batch_size, max_time_ms=mongo.max_time_ms or None, allow_disk_use=query_guard.allow_disk_use)
+            if self.max_documents:
+                cursor = cursor.limit(self.max_documents)
+            return cursor
+
+        if self.max_documents:
+            pipeline = list(pipeline) + [{"$limit": self.max_documents}]
+        options = {"batchSize": batch_size, **query_guard.aggregate_options()}
+        if mongo.max_time_ms:
+            options["maxTimeMS"] = mongo.max_time_ms
+        return col.aggregate(pipeline, **options)
+
+    def _iter_cursor_pages(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int) -> Iterator[List[Dict]]:
+        page: List[Dict] = []
+        with self._open_cursor(collection_name, filter, pipeline, batch_size) as cursor:
+            for doc in cursor:
+                page.append(doc)
+                if len(page) >= batch_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def _iter_pages(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int, span=None) -> Iterator[List[Dict]]:
+        """
+        Cursor pages for a query, from one cursor or, in fan-out mode, from
+        concurrent per-collection cursors in arrival order. Fan-out keeps the
+        `max_documents` cap across all branches.
+        """
+        branches = split_union_pipeline(collection_name, pipeline) if self.fan_out and pipeline is not None else None
+        if not branches:
+            yield from self._iter_cursor_pages(collection_name, filter, pipeline, batch_size)
+            return
+        if span is not None:
+            span.set(branches=len(branches))
+
+        def _source(coll, stages):
+            return lambda: self._iter_cursor_pages(coll, None, stages, batch_size)
+
+        remaining = self.max_documents or None
+        pages = merge_concurrently([_source(coll, stages) for coll, stages in branches])
+        try:
+            for page in pages:
+                if remaining is not None:
+                    page = page[:remaining]
+                    remaining -= len(page)
+                if page:
+                    yield page
+                if remaining == 0:
+                    break
+        finally:
+            pages.close()
+
+    def iter_pages(
+        self,
+        filter: Optional[Dict] = None,
+        pipeline: Optional[List[Dict]] = None,
+        collection_hint = "apartments",
+        batch_size: Optional[int] = None,
+    ) -> Iterator[List[Dict]]:
+        """
+        Yield result documents in pages of `batch_size`, as the cursor fetches them.
+        Always reads from the database. Raises ValueError for invalid input.
+        """
+        batch_size = batch_size or self.batch_size
+        collection_name, filter, pipeline = self._parse_query(filter, pipeline, collection_hint)
+        collection_name, filter, pipeline = self._optimize(collection_name, filter, pipeline)
+        query_guard.explain(get_db(), collection_name, filter, pipeline)
+        yield from self._iter_pages(collection_name, filter, pipeline, batch_size)
+
+    def stream(
+        self,
+        filter: Optional[Dict] = None,
+        pipeline: Optional[List[Dict]] = None,
+        collection_hint = "apartments",
+        batch_size: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        Yield the JSON array of results in chunks, one chunk per cursor page,
+        so callers never hold more than one page of documents at a time.
+        Yields the no-data message when nothing matches. Served from
+        `result_cache` when an identical query ran recently.
+        """
+        self.last_count = 0
+        batch_size = batch_size or self.batch_size
+        collection_name, filter, pipeline = self._parse_query(filter, pipeline, collection_hint)
+        collection_name, filter, pipeline = self._optimize(collection_name, filter, pipeline)
+
+        with tracer.span("mongo.query", collection=collection_name, kind="find" if filter is not None else "aggregate") as span:
+            use_cache = self.use_cache and result_cache.enabled
+            if use_cache:
+                if CACHE_WATCH_CHANGES:
+                    result_cache.watch(get_db(), PROPERTY_COLLECTIONS)
+                # A find's projection isn't part of `filter`
+                key = result_cache.make_key(collection_name, filter, pipeline, self.max_documents, self.project_summary_fields)
+                cached = result_cache.get(key)
+                if cached is not None:
+                    payload, self.last_count = cached
+                    span.set(cache_hit=True, docs=self.last_count, bytes=len(payload))
+                    yield payload
+                    return
+                version = result_cache.version
+
+            query_guard.explain(get_db(), collection_name, filter, pipeline, span)
+            # Keep a copy for the cache only while the payload fits in one entry
+            kept: Optional[List[str]] = [] if use_cache else None
+            kept_bytes = 0
+            payload_bytes = 0
+            pages = self._count_pages(self._iter_pages(collection_name, filter, pipeline, batch_size, span), span)
+            try:
+                for chunk in encode_json_chunks(pages):
+                    payload_bytes += len(chunk)
+                    if kept is not None:
+                        kept_bytes += len(chunk)
+                        if kept_bytes <= result_cache.max_entry_bytes:
+                            kept.append(chunk)
+                        else:
+                            kept = None
+                    yield chunk
+            finally:
+                span.set(cache_hit=False, docs=self.last_count, bytes=payload_bytes)
+
+            if kept is not None:
+                result_cache.put(key, "".join(kept), self.last_count, version)
+
+    def fetch_page(
+        self,
+        pipeline: List[Dict],
+        collection_hint = "apartments",
+        after = None,
+        page_size: int = 10,
+    ) -> Tuple[List[Dict], bool]:
+        """
+        One page of a pipeline's results in `_id` order, starting after the
+        `_id` `after` (keyset pagination, see tools/pagination.py). Returns
+        (documents, has_more); documents keep their `_id` so the caller can
+        continue after the last one. The query is optimized first, so pages
+        use the listings view and fan-out like `stream`, and are served from
+        `result_cache` by page. Raises ValueError for invalid input.
+        """
+        self.last_count = 0
+        collection_name, _, pipeline = self._parse_query(None, pipeline, collection_hint)
+        collection_name, _, pipeline = self._optimize(collection_name, None, pipeline, keep_id=True)
+        # One extra document tells whether another page follows
+        limit = page_size + 1
+        # The view keeps each listing's own _id as `source_id`
+        key = "source_id" if collection_name == LISTINGS_VIEW else "_id"
+
+        with tracer.span("mongo.query", collection=collection_name, kind="page", after=str(after) if after is not None else None) as span:
+            use_cache = self.use_cache and result_cache.enabled
+            if use_cache:
+                if CACHE_WATCH_CHANGES:
+                    result_cache.watch(get_db(), PROPERTY_COLLECTIONS)
+                cache_key = result_cache.make_key(collection_name, None, pipeline, "page", after, limit)
+                cached = result_cache.get(cache_key)
+                if cached is not None:
+                    payload, count = cached
+                    docs = loads(payload)
+                    span.set(cache_hit=True, docs=count, bytes=len(payload))
+                    self.last_count = min(count, page_size)
+                    return docs[:page_size], count > page_size
+                version = result_cache.version
+
+            query_guard.explain(get_db(), collection_name, None, keyset_pipeline(pipeline, after, limit, key), span)
+            branches = split_union_pipeline(collection_name, pipeline) if self.fan_out else None
+            if branches:
+                # Each collection returns its own first page; the merged
+                # pages are cut back to one in _id order
+                span.set(branches=len(branches))
+
+                def _source(coll, stages):
+                    return lambda: self._iter_cursor_pages(coll, None, keyset_pipeline(stages, after, limit), limit)
+                pages = merge_concurrently([_source(coll, stages) for coll, stages in branches])
+                docs = sorted((doc for page in self._count_pages(pages, span) for doc in page), key=lambda doc: doc["_id"])[:limit]
+            else:
+                paged = keyset_pipeline(pipeline, after, limit, key)
+                docs = [doc for page in self._count_pages(self._iter_cursor_pages(collection_name, None, paged, limit), span) for doc in page]
+            payload = dumps(docs)
+            span.set(cache_hit=False, docs=len(docs), bytes=len(payload))
+            if use_cache:
+                result_cache.put(cache_key, payload, len(docs), version)
+        self.last_count = min(len(docs), page_size)
+        return docs[:page_size], len(docs) > page_size
+
+    def _count_pages(self, pages: Iterable[List[Dict]], span=None) -> Iterator[List[Dict]]:
+        # Time spent waiting on the cursor, as opposed to encoding pages
+        cursor_seconds = 0.0
+        pages = iter(pages)
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                break
+            finally:
+                cursor_seconds += time.perf_counter() - started
+                if span is not None:
+                    span.set(cursor_ms=round(cursor_seconds * 1000, 3))
+            self.last_count += len(page)
+            yield page
+
+    async def astream(
+        self,
+        filter: Optional[Dict] = None,
+        pipeline: Optional[List[Dict]] = None,
+        collection_hint = "apartments",
+        batch_size: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of `stream` on the shared asyncio client, for callers
+        running in an event loop. Shares `result_cache` with the sync path.
+        """
+        self.last_count = 0
+        batch_size = batch_size or self.batch_size
+        collection_name, filter, pipeline = self._parse_query(filter, pipeline, collection_hint)
+        collection_name, filter, pipeline = self._optimize(collection_name, filter, pipeline)
+
+        with tracer.span("mongo.query", collection=collection_name, kind="find" if filter is not None else "aggregate", driver="async") as span:
+            use_cache = self.use_cache and result_cache.enabled
+            if use_cache:
+                # A find's projection isn't part of `filter`
+                key = result_cache.make_key(collection_name, filter, pipeline, self.max_documents, self.project_summary_fields)
+                cached = result_cache.get(key)
+                if cached is not None:
+                    payload, self.last_count = cached
+                    span.set(cache_hit=True, docs=self.last_count, bytes=len(payload))
+                    yield payload
+                    return
+                version = result_cache.version
+
+            await query_guard.aexplain(mongo.async_db, collection_name, filter, pipeline, span)
+            kept: Optional[List[str]] = [] if use_cache else None
+            payload_bytes = 0
+            async for chunk in self._aencode_json_chunks(self._aiter_pages(collection_name, filter, pipeline, batch_size, span)):
+                payload_bytes += len(chunk)
+                if kept is not None:
+                    if payload_bytes <= result_cache.max_entry_bytes:
+                        kept.append(chunk)
+                    else:
+                        kept = None
+                yield chunk
+
+            span.set(cache_hit=False, docs=self.last_count, bytes=payload_bytes)
+            if kept is not None:
+                result_cache.put(key, "".join(kept), self.last_count, version)
+
+    async def _aiter_pages(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int, span=None) -> AsyncIterator[List[Dict]]:
+        """
+        Async counterpart of `_iter_pages`; fan-out branches run as tasks on
+        the event loop.
+        """
+        branches = split_union_pipeline(collection_name, pipeline) if self.fan_out and pipeline is not None else None
+        if not branches:
+            async for page in self._aopen_pages(collection_name, filter, pipeline, batch_size):
+                yield page
+            return
+        if span is not None:
+            span.set(branches=len(branches))
+
+        def _source(coll, stages):
+            return lambda: self._aopen_pages(coll, None, stages, batch_size)
+
+        remaining = self.max_documents or None
+        pages = amerge_concurrently([_source(coll, stages) for coll, stages in branches])
+        try:
+            async for page in pages:
+                if remaining is not None:
+                    page = page[:remaining]
+                    remaining -= len(page)
+                if page:
+                    yield page
+                if remaining == 0:
+                    break
+        finally:
+            await pages.aclose()
+
+    async def _aopen_pages(self, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], batch_size: int) -> AsyncIterator[List[Dict]]:
+        cursor = self._cursor_for(mongo.async_db[collection_name], filter, pipeline, batch_size)
+        if inspect.isawaitable(cursor):
+            cursor = await cursor
+        async for page in self._aiter_cursor_pages(cursor, batch_size):
+            yield page
+
+    @staticmethod
+    async def _aiter_cursor_pages(cursor, batch_size: int) -> AsyncIterator[List[Dict]]:
+        page: List[Dict] = []
+        async for doc in cursor:
+            page.append(doc)
+            if len(page) >= batch_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    async def _aencode_json_chunks(self, pages: AsyncIterator[List[Dict]]) -> AsyncIterator[str]:
+        """
+        Async counterpart of `encode_json_chunks` that also counts documents.
+        """
+        async for page in pages:
+            body = ",".join(compact_dumps(doc) for doc in page)
+            yield ("," if self.last_count else "[") + body
+            self.last_count += len(page)
+        yield "]" if self.last_count else NO_DATA_MESSAGE
+
+    async def _arun(
         self,
         filter: Optional[Dict] = None,
         pipeline: Optional[List[Dict]] = None,
         collection_hint = "apartments"
     ) -> str:
         try:
-            # Clean and parse filter if it is a string (from LLM)
-            if filter and isinstance(filter, str):
-                try:
-                    filter = self._extract_json_from_string(filter)
-                except ValueError as e:
-                    return f"Error parsing filter JSON: {str(e)}"
-
-            # Clean and parse pipeline if it is a string (from LLM)
-            if pipeline and isinstance(pipeline, str):
-                try:
-                    pipeline = self._extract_json_from_string(pipeline)
-                except ValueError as e:
-                    return f"Error parsing pipeline JSON: {str(e)}"
-
-            # Proceed with existing logic
-            if filter:
-                collection_name = filter.pop("_collection", None) or collection_hint
-                if not collection_name:
-                    return "Error: Collection name not found. Provide '_collection' in filter or set 'collection_hint'."
-                col = db[collection_name]
-                docs = list(col.find(filter, {"_id": 0}))
-                self.last_output = dumps(docs) if docs else "No properties found matching your criteria."
-                return self.last_output
-            
-            elif pipeline:
-                if not isinstance(pipeline, list) or not pipeline:
-                    return "Error: Pipeline must be a non-empty list of stages."
-                
-                # Attempt to auto-detect base collection
-                collection_name = collection_hint #pipeline[0].get("_collection") or collection_hint
-                if not collection_name:
-                    # Check for any $unionWith stage and use its first coll if nothing else
-                    for stage in pipeline:
-                        if "$unionWith" in stage:
-                            union_stage = stage["$unionWith"]
-                            if isinstance(union_stage, dict) and "coll" in union_stage:
-                                collection_name = union_stage["coll"]
-                            elif isinstance(union_stage, str):
-                                collection_name = union_stage
-                            break
-
-                    # If no $unionWith found, default to error
-                    if not collection_name:
-                        return "Error: Base collection not found. Provide 'collection_hint' or ensure pipeline includes $unionWith with 'coll'."
-
-                    print(f"[Info] Auto-detected base collection: {collection_name}")
-
-                col = db[collection_name]
-                docs = list(col.aggregate(pipeline))
-                self.last_output = dumps(docs) if docs else "No properties found matching your criteria."
-                return self.last_output
-
-            return "Error: Neither 'filter' nor 'pipeline' provided."
-                
-                
-            #     collection_name = pipeline[0].pop("_collection", None) or collection_hint
-            #     if not collection_name:
-            #         return "Error: Collection name not found. Provide '_collection' in pipeline[0] or set 'collection_hint'."
-            #     col = db[collection_name]
-            #     docs = list(col.aggregate(pipeline))
-            #     self.last_output = dumps(docs) if docs else "No properties found matching your criteria."
-            #     return self.last_output
-            
-            # return "Error: Neither 'filter' nor 'pipeline' provided."
+            self.last_output = "".join([chunk async for chunk in self.astream(filter, pipeline, collection_hint)])
+            return self.last_output
+        except ValueError as e:
+            return str(e)
+        except Exception as e:
+            return f"Error while querying MongoDB: {str(e)}"
 
+    def _run(
+        self,
+        filter: Optional[Dict] = None,
+        pipeline: Optional[List[Dict]] = None,
+        collection_hint = "apartments"
+    ) -> str:
+        try:
+            self.last_output = "".join(self.stream(filter, pipeline, collection_hint))
+            return self.last_output
+        except ValueError as e:
+            return str(e)
         except Exception as e:
             return f"Error while querying MongoDB: {str(e)}"
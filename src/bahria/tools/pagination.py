@@ -0,0 +1,69 @@
+"""
+Keyset (range-based) pagination for search pipelines.
+
+Pages are ordered by a unique key (`_id`) and continue after the last key
+shown, so a page never re-reads the listings before it. The range, sort and
+limit go right after each leading `$match`: for the canonical "`$match` then
+one `$unionWith` per collection" search every collection returns at most one
+page instead of every match being unioned and sorted on each request.
+
+`MongoTool.fetch_page` applies this after `_optimize`, so a search collapsed
+onto the `all_listings` view is paged on the view's `source_id`, and each
+fan-out branch is paged on its own.
+"""
+from typing import List, Dict
+
+
+# Stages that map each document to exactly one document, so a page can be
+# cut before them without changing which documents are in it
+_ONE_TO_ONE_STAGES = {"$project", "$set", "$unset", "$addFields"}
+
+
+def _one_to_one(stages: List[Dict]) -> bool:
+    return all(len(stage) == 1 and next(iter(stage)) in _ONE_TO_ONE_STAGES for stage in stages)
+
+
+def _keyset_match(match: Dict, after, key: str) -> Dict:
+    if after is None:
+        return dict(match)
+    if key in match:
+        return {"$and": [match, {key: {"$gt": after}}]}
+    return {**match, key: {"$gt": after}}
+
+
+def _page_stages(after, limit: int, key: str) -> List[Dict]:
+    stages = [{"$match": {key: {"$gt": after}}}] if after is not None else []
+    return stages + [{"$sort": {key: 1}}, {"$limit": limit}]
+
+
+def _page_branch(stages: List[Dict], after, limit: int, key: str) -> List[Dict]:
+    # "$match, then one-to-one stages": page right after the match
+    if stages and "$match" in stages[0] and _one_to_one(stages[1:]):
+        return [{"$match": _keyset_match(stages[0]["$match"], after, key)}] + _page_stages(None, limit, key) + stages[1:]
+    return list(stages) + _page_stages(after, limit, key)
+
+
+def keyset_pipeline(pipeline: List[Dict], after=None, limit: int = 10, key: str = "_id") -> List[Dict]:
+    """
+    Rewrite `pipeline` to return the first `limit` results with `key`
+    greater than `after` (from the start when None), in `key` order. The
+    base stages and every `$unionWith` branch are paged on their own and the
+    union is cut back to one page; a pipeline that groups or filters after
+    its unions is paged after its last stage.
+    """
+    first = next((i for i, stage in enumerate(pipeline) if "$unionWith" in stage), None)
+    if first is None:
+        return _page_branch(pipeline, after, limit, key)
+
+    paged = _page_branch(pipeline[:first], after, limit, key)
+    index = first
+    while index < len(pipeline) and "$unionWith" in pipeline[index]:
+        union = pipeline[index]["$unionWith"]
+        coll, sub = (union, []) if isinstance(union, str) else (union.get("coll"), union.get("pipeline", []))
+        paged.append({"$unionWith": {"coll": coll, "pipeline": _page_branch(sub, after, limit, key)}})
+        index += 1
+    tail = pipeline[index:]
+    if not _one_to_one(tail):
+        return list(pipeline) + _page_stages(after, limit, key)
+    # The union of per-branch pages, cut back down to one page
+    return paged + tail + [{"$sort": {key: 1}}, {"$limit": limit}]
@@ -0,0 +1,69 @@
+from typing import List, Dict
+from bson.json_util import dumps
+
+
+# ------------------------------
+# Summary Projection
+# ------------------------------
+# Fields the "Summary Format" in config/tasks.yaml renders, plus the few the
+# summarizer needs to pick out what the user asked for (bedrooms, rent, ...).
+SUMMARY_FIELDS: List[str] = [
+    # Title: [society] [size] [property_type] for [list_type]
+    "society", "size", "property_type", "list_type",
+    # Basic Details
+    "payment_type", "price", "installment", "monthly_rent", "building_name", "commercialName",
+    # Location
+    "city", "phase", "sector", "pin_location",
+    # Property Specifics
+    "ownership", "earth_status", "extra_land", "allotment", "bedrooms", "bathrooms",
+    # Contact Information
+    "office_Name", "email", "contact_Number",
+]
+
+SUMMARY_PROJECTION: Dict = {"_id": 0, **{field: 1 for field in SUMMARY_FIELDS}}
+
+# Stages that keep documents in their stored shape, so a trailing `$project`
+# of SUMMARY_FIELDS is still meaningful after them.
+_SHAPE_PRESERVING_STAGES = {"$match", "$unionWith", "$sort", "$limit", "$skip", "$set", "$unset", "$addFields"}
+
+
+def project_pipeline(pipeline: List[Dict], projection: Dict = SUMMARY_PROJECTION) -> List[Dict]:
+    """
+    Push `projection` into every `$unionWith` sub-pipeline and onto the end of
+    the pipeline. Pipelines that reshape documents (`$group`, `$project`, ...)
+    are returned unchanged.
+    """
+    if not all(len(stage) == 1 and next(iter(stage)) in _SHAPE_PRESERVING_STAGES for stage in pipeline):
+        return pipeline
+
+    projected = []
+    for stage in pipeline:
+        union = stage.get("$unionWith")
+        if isinstance(union, dict) and isinstance(union.get("pipeline"), list):
+            stage = {"$unionWith": {**union, "pipeline": project_pipeline(union["pipeline"], projection)}}
+        projected.append(stage)
+    return projected + [{"$project": dict(projection)}]
+
+
+# ------------------------------
+# Compact Serialization
+# ------------------------------
+def compact(value):
+    """
+    Recursively drop None, empty strings and empty containers.
+    """
+    if isinstance(value, dict):
+        items = ((k, compact(v)) for k, v in value.items())
+        return {k: v for k, v in items if v is not None and v != "" and v != {} and v != []}
+    if isinstance(value, list):
+        items = (compact(v) for v in value)
+        return [v for v in items if v is not None and v != "" and v != {} and v != []]
+    return value
+
+
+def compact_dumps(doc: Dict) -> str:
+    """
+    Serialize a document for the LLM: no empty fields, no whitespace between
+    separators, non-ASCII kept as is.
+    """
+    return dumps(compact(doc), separators=(",", ":"), ensure_ascii=False)
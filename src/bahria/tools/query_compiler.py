@@ -0,0 +1,182 @@
+import re
+from typing import Optional, List, Dict, Union
+
+
+# ------------------------------
+# Vocabulary
+# ------------------------------
+# Base collection first, then every collection that gets unioned into it.
+# This is the fixed shape `prompt.txt` asks the agent to produce.
+PROPERTY_COLLECTIONS: List[str] = [
+    "apartments",
+    "homes",
+    "shops",
+    "commercial_plots",
+    "farmhouses",
+    "residential_plots",
+    "plazas",
+]
+
+# Canonical city name -> spellings users actually type.
+CITY_ALIASES: Dict[str, List[str]] = {
+    "Lahore": ["lahore", "lhr"],
+    "Karachi": ["karachi", "khi"],
+    "Rawalpindi": ["rawalpindi", "pindi", "rwp"],
+    "Islamabad": ["islamabad", "isb", "isl"],
+    "Nawabshah": ["nawabshah"],
+    "Multan": ["multan"],
+    "Faisalabad": ["faisalabad"],
+    "Peshawar": ["peshawar"],
+    "Gujranwala": ["gujranwala"],
+    "Sialkot": ["sialkot"],
+    "Hyderabad": ["hyderabad"],
+    "Quetta": ["quetta"],
+}
+
+# Society regex term (as used in `prompt.txt`) -> spellings users actually type.
+# Longer, more specific societies are listed before the generic ones they contain.
+SOCIETY_ALIASES: Dict[str, List[str]] = {
+    "bahria enclave": ["bahria enclave"],
+    "bahria orchard": ["bahria orchard"],
+    "bahria town": ["bahria town", "bahria"],
+    "dha": ["dha", "defence housing authority", "defense housing authority", "defence", "defense"],
+    "gulberg": ["gulberg"],
+    "askari": ["askari"],
+    "model town": ["model town"],
+    "johar town": ["johar town"],
+    "gulshan": ["gulshan"],
+    "clifton": ["clifton"],
+    "cantt": ["cantt", "cantonment"],
+}
+
+PROPERTY_TYPE_ALIASES: Dict[str, List[str]] = {
+    "apartment": ["apartment", "flat", "portion"],
+    "home": ["home", "house"],
+    "shop": ["shop"],
+    "commercial plot": ["commercial plot"],
+    "farmhouse": ["farmhouse", "farm house"],
+    "residential plot": ["residential plot"],
+    "plot": ["plot"],
+    "plaza": ["plaza"],
+}
+
+# A bare "bahria" means Bahria Town only when the next word can't be part of
+# another society's name ("Bahria Lahore", "Bahria phase 8"). "Bahria
+# Paradise", "Bahria Sports City" etc. are societies we have no alias for, so
+# those queries are left to the agent.
+_BAHRIA_FOLLOWERS = (
+    {"town", "enclave", "orchard", "phase", "sector", "society", "for", "in", "at", "near", "with", "and", "or", "mein", "me", "ka", "ki", "please"}
+    | {word for names in CITY_ALIASES.values() for name in names for word in name.split()}
+    | {name.split()[0] for names in PROPERTY_TYPE_ALIASES.values() for name in names}
+)
+
+
+def _names_unknown_bahria(text: str) -> bool:
+    for match in re.finditer(r"\bbahria\s+([a-z]+)", text.lower()):
+        follower = match.group(1)
+        if follower not in _BAHRIA_FOLLOWERS and follower.rstrip("s") not in _BAHRIA_FOLLOWERS:
+            return True
+    return False
+
+
+def regex_escape(term: str) -> str:
+    """
+    Escape regex metacharacters only, leaving spaces readable, so the pattern
+    stays identical to the hand-written ones in `prompt.txt`.
+    """
+    return re.sub(r"([.^$*+?{}\[\]\\|()])", r"\\\1", term)
+
+
+def _find_terms(text: str, aliases: Dict[str, List[str]]) -> List[str]:
+    """
+    Return the canonical keys whose aliases appear as whole words in `text`,
+    in the order they appear. An alias is not counted again once a longer
+    alias has already consumed that span of the text.
+    """
+    text = text.lower()
+    spans = []
+    for canonical, names in aliases.items():
+        for name in names:
+            # Allow a trailing plural "s" ("plots", "homes")
+            for match in re.finditer(r"\b" + re.escape(name) + r"s?\b", text):
+                spans.append((match.start(), match.end(), canonical))
+
+    # Longest match wins where two aliases overlap
+    spans.sort(key=lambda s: (s[0], -(s[1] - s[0])))
+    found: List[str] = []
+    consumed_until = -1
+    for start, end, canonical in spans:
+        if start < consumed_until:
+            continue
+        consumed_until = end
+        if canonical not in found:
+            found.append(canonical)
+    return found
+
+
+def extract_query_spec(property_details: Union[str, Dict, None]) -> Optional[Dict[str, List[str]]]:
+    """
+    Pull city, society and property type out of either the one-line
+    `property_details` summary or a structured dict such as
+    {"city": "Lahore", "society": "Bahria Town", "property_type": "home"}.
+    Returns None when city or society cannot be identified, including a
+    "Bahria ..." society that isn't in SOCIETY_ALIASES.
+    """
+    if not property_details:
+        return None
+
+    if isinstance(property_details, dict):
+        def _as_list(value):
+            if not value:
+                return []
+            return value if isinstance(value, list) else [value]
+
+        cities = [str(c).strip().title() for c in _as_list(property_details.get("city")) if str(c).strip()]
+        societies = [str(s).strip().lower() for s in _as_list(property_details.get("society")) if str(s).strip()]
+        if any(_names_unknown_bahria(s) for s in societies):
+            return None
+        property_types = [str(p).strip().lower() for p in _as_list(property_details.get("property_type")) if str(p).strip()]
+        # Normalize structured values through the same vocabulary where possible
+        cities = [(_find_terms(c, CITY_ALIASES) or [c])[0] for c in cities]
+        societies = [(_find_terms(s, SOCIETY_ALIASES) or [s])[0] for s in societies]
+    else:
+        text = str(property_details)
+        if _names_unknown_bahria(text):
+            return None
+        cities = _find_terms(text, CITY_ALIASES)
+        societies = _find_terms(text, SOCIETY_ALIASES)
+        property_types = _find_terms(text, PROPERTY_TYPE_ALIASES)
+
+    if not cities or not societies:
+        return None
+    return {"city": cities, "society": societies, "property_type": property_types}
+
+
+def build_match(spec: Dict[str, List[str]]) -> Dict:
+    """
+    Build the `$match` stage body for a query spec, mirroring the examples in
+    `prompt.txt`: exact city, case-insensitive society regex.
+    """
+    cities = spec["city"]
+    societies = spec["society"]
+    city_clause = cities[0] if len(cities) == 1 else {"$in": cities}
+    society_regex = "|".join(regex_escape(s) for s in societies)
+    return {"city": city_clause, "society": {"$regex": society_regex, "$options": "i"}}
+
+
+def compile_pipeline(property_details: Union[str, Dict, None]) -> Optional[List[Dict]]:
+    """
+    Compile `property_details` into the canonical city/society aggregation
+    pipeline, to be run against the first entry of PROPERTY_COLLECTIONS.
+    Returns None when the details cannot be compiled, so the caller can fall
+    back to the property agent.
+    """
+    spec = extract_query_spec(property_details)
+    if not spec:
+        return None
+
+    match = build_match(spec)
+    pipeline: List[Dict] = [{"$match": match}]
+    for coll in PROPERTY_COLLECTIONS[1:]:
+        pipeline.append({"$unionWith": {"coll": coll, "pipeline": [{"$match": dict(match)}]}})
+    return pipeline
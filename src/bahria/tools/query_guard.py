@@ -0,0 +1,253 @@
+"""
+Cost guard for the queries `MongoTool` runs.
+
+Filters and pipelines come from the model, so before one reaches the server
+it is checked against a stage allow-list and for server-side JavaScript and
+writes; `$limit` and `maxTimeMS` are already added by `MongoTool`, and
+`allowDiskUse` is set explicitly so a runaway `$sort`/`$group` fails within
+its time budget instead of spilling to disk.
+
+Optionally, queries are run through `explain` (queryPlanner verbosity, which
+plans without executing) first: plans that scan a whole collection larger
+than `collscan_max_docs` are rejected, and a sample of plans is appended to a
+JSONL file for offline analysis:
+
+    MONGO_REJECT_COLLSCAN=true MONGO_EXPLAIN_SAMPLE_RATE=0.01 streamlit run main.py
+"""
+import os, json, time, random, threading
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Iterator, Set, Tuple
+
+from transcript import JsonlWriter
+
+
+# Read-only stages a search needs. `$out`/`$merge` write, `$lookup`,
+# `$graphLookup` and `$facet` multiply the work per document.
+DEFAULT_ALLOWED_STAGES = {
+    "$match", "$project", "$addFields", "$set", "$unset", "$unionWith", "$sort", "$limit", "$skip",
+    "$count", "$group", "$unwind", "$replaceRoot", "$replaceWith", "$sortByCount", "$sample",
+}
+
+# Operators that run JavaScript on the server, allowed nowhere in a query
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator"}
+
+
+class QueryRejected(ValueError):
+    """
+    A query the guard refused to run. A ValueError, so `MongoTool._run`
+    returns the message to the agent like any other invalid input; compiled
+    searches catch it and tell the user the search is too broad.
+    """
+
+
+def _walk(value) -> Iterator[Tuple[str, object]]:
+    # Every (key, value) pair in a nested filter, pipeline or explain output
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield key, item
+            yield from _walk(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk(item)
+
+
+def _plan_stages(plan) -> List[str]:
+    return [item for key, item in _walk(plan) if key == "stage" and isinstance(item, str)]
+
+
+def summarize_plan(explain: Dict) -> Dict:
+    """
+    Reduce explain output to what matters offline: the winning plan's stages
+    and indexes per namespace, and the namespaces read with a COLLSCAN.
+    Works for find, aggregate and the per-branch plans of `$unionWith`.
+    """
+    plans: Dict[str, Dict] = {}
+    for key, planner in _walk(explain):
+        if key != "queryPlanner" or not isinstance(planner, dict):
+            continue
+        collection = str(planner.get("namespace", "")).split(".", 1)[-1]
+        winning = planner.get("winningPlan", {})
+        stages = _plan_stages(winning)
+        indexes = sorted({item for name, item in _walk(winning) if name == "indexName" and isinstance(item, str)})
+        entry = plans.setdefault(collection, {"stages": [], "indexes": []})
+        entry["stages"] += stages
+        entry["indexes"] = sorted(set(entry["indexes"]) | set(indexes))
+    return {
+        "plans": plans,
+        "collscans": sorted(collection for collection, entry in plans.items() if "COLLSCAN" in entry["stages"]),
+    }
+
+
+class QueryGuard:
+    """
+    Validates queries before they run and, when enabled, explains them.
+    `explain` and `aexplain` take the sync or async database handle; both
+    fail open, so a server that can't explain never blocks a search.
+    """
+
+    def __init__(
+        self,
+        allowed_stages: Optional[Set[str]] = None,
+        max_stages: int = 40,
+        allow_disk_use: bool = False,
+        reject_collscan: bool = False,
+        collscan_max_docs: int = 10000,
+        explain_sample_rate: float = 0.0,
+        plan_log_path: Optional[str] = None,
+        count_ttl_seconds: float = 600,
+    ):
+        self.allowed_stages = allowed_stages or set(DEFAULT_ALLOWED_STAGES)
+        self.max_stages = max_stages
+        self.allow_disk_use = allow_disk_use
+        self.reject_collscan = reject_collscan
+        self.collscan_max_docs = collscan_max_docs
+        self.explain_sample_rate = explain_sample_rate
+        self.plan_log = JsonlWriter(plan_log_path, max_bytes=20 * 1024 * 1024, backups=3) if plan_log_path else None
+        self.count_ttl_seconds = count_ttl_seconds
+        # collection -> (estimated document count, expiry)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------
+    # Static checks
+    # ------------------------------
+    def check(self, filter: Optional[Dict], pipeline: Optional[List[Dict]]):
+        """
+        Raise QueryRejected for a forbidden operator, a stage outside the
+        allow-list (including inside `$unionWith` sub-pipelines) or a
+        pipeline with more than `max_stages` stages in total.
+        """
+        query = filter if filter is not None else pipeline
+        operator = next((key for key, _ in _walk(query) if key in FORBIDDEN_OPERATORS), None)
+        if operator:
+            raise QueryRejected(f"Error: Query rejected: {operator} is not allowed.")
+        if pipeline is not None:
+            count = self._check_stages(pipeline)
+            if count > self.max_stages:
+                raise QueryRejected(f"Error: Query rejected: {count} pipeline stages (at most {self.max_stages}).")
+
+    def _check_stages(self, pipeline: List[Dict]) -> int:
+        count = 0
+        for stage in pipeline:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                raise QueryRejected("Error: Query rejected: every pipeline stage must be an object with one operator.")
+            name, spec = next(iter(stage.items()))
+            if name not in self.allowed_stages:
+                raise QueryRejected(f"Error: Query rejected: stage {name} is not allowed.")
+            count += 1
+            if name == "$unionWith" and isinstance(spec, dict):
+                count += self._check_stages(spec.get("pipeline", []))
+        return count
+
+    def aggregate_options(self) -> Dict:
+        return {"allowDiskUse": self.allow_disk_use}
+
+    # ------------------------------
+    # Explain
+    # ------------------------------
+    def should_explain(self) -> Tuple[bool, bool]:
+        """
+        (explain, sampled) for the next query: always explained when
+        collection scans are rejected, else only when sampled for the log.
+        """
+        sampled = self.explain_sample_rate > 0 and random.random() < self.explain_sample_rate
+        return self.reject_collscan or sampled, sampled
+
+    @staticmethod
+    def explain_command(collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]]) -> Dict:
+        if filter is not None:
+            return {"find": collection_name, "filter": filter}
+        return {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}}
+
+    def explain(self, db, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], span=None) -> Optional[Dict]:
+        """
+        Explain the query if this one is due, log the plan if sampled and
+        raise QueryRejected for an oversized collection scan. Returns the
+        plan summary, or None when nothing was explained.
+        """
+        due, sampled = self.should_explain()
+        if not due:
+            return None
+        try:
+            explain = db.command("explain", self.explain_command(collection_name, filter, pipeline), verbosity="queryPlanner")
+            summary = summarize_plan(explain)
+            counts = {collection: self._count(db, collection) for collection in summary["collscans"]} if self.reject_collscan else {}
+        except Exception as e:
+            print(f"[Info] Explain failed, running the query unchecked: {str(e)}")
+            if span is not None:
+                span.set(explain_error=type(e).__name__)
+            return None
+        return self._review(collection_name, filter, pipeline, summary, counts, sampled, span)
+
+    async def aexplain(self, db, collection_name: str, filter: Optional[Dict], pipeline: Optional[List[Dict]], span=None) -> Optional[Dict]:
+        """
+        Async counterpart of `explain` on the asyncio database handle.
+        """
+        due, sampled = self.should_explain()
+        if not due:
+            return None
+        try:
+            explain = await db.command("explain", self.explain_command(collection_name, filter, pipeline), verbosity="queryPlanner")
+            summary = summarize_plan(explain)
+            counts = {}
+            if self.reject_collscan:
+                for collection in summary["collscans"]:
+                    counts[collection] = self._cached_count(collection)
+                    if counts[collection] is None:
+                        counts[collection] = self._store_count(collection, await db[collection].estimated_document_count())
+        except Exception as e:
+            print(f"[Info] Explain failed, running the query unchecked: {str(e)}")
+            if span is not None:
+                span.set(explain_error=type(e).__name__)
+            return None
+        return self._review(collection_name, filter, pipeline, summary, counts, sampled, span)
+
+    def _review(self, collection_name, filter, pipeline, summary: Dict, counts: Dict[str, int], sampled: bool, span) -> Dict:
+        oversized = sorted(collection for collection, count in counts.items() if count > self.collscan_max_docs)
+        rejected = bool(oversized)
+        if span is not None:
+            span.set(collscans=len(summary["collscans"]), rejected=rejected)
+        if self.plan_log is not None and (sampled or rejected):
+            self.plan_log.append([{
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "collection": collection_name,
+                "kind": "find" if filter is not None else "aggregate",
+                # ObjectIds and dates (keyset pages) as strings
+                "query": json.loads(json.dumps(filter if filter is not None else pipeline, default=str)),
+                "rejected": rejected,
+                "collection_counts": counts,
+                **summary,
+            }])
+        if rejected:
+            raise QueryRejected(
+                f"Error: Query rejected: it would scan every document in {', '.join(oversized)}. "
+                "Add an indexed filter such as city and society."
+            )
+        return summary
+
+    def _cached_count(self, collection: str) -> Optional[int]:
+        with self._lock:
+            cached = self._counts.get(collection)
+        return cached[0] if cached is not None and cached[1] > time.monotonic() else None
+
+    def _store_count(self, collection: str, count: int) -> int:
+        with self._lock:
+            self._counts[collection] = (count, time.monotonic() + self.count_ttl_seconds)
+        return count
+
+    def _count(self, db, collection: str) -> int:
+        count = self._cached_count(collection)
+        return count if count is not None else self._store_count(collection, db[collection].estimated_document_count())
+
+
+_allowed = os.getenv("MONGO_ALLOWED_STAGES")
+
+query_guard = QueryGuard(
+    allowed_stages={stage.strip() for stage in _allowed.split(",") if stage.strip()} if _allowed else None,
+    max_stages=int(os.getenv("MONGO_MAX_PIPELINE_STAGES", "40")),
+    allow_disk_use=os.getenv("MONGO_ALLOW_DISK_USE", "false").lower() == "true",
+    reject_collscan=os.getenv("MONGO_REJECT_COLLSCAN", "false").lower() == "true",
+    collscan_max_docs=int(os.getenv("MONGO_COLLSCAN_MAX_DOCS", "10000")),
+    explain_sample_rate=float(os.getenv("MONGO_EXPLAIN_SAMPLE_RATE", "0")),
+    plan_log_path=os.getenv("MONGO_PLAN_LOG", "mongo_plans.jsonl"),
+)
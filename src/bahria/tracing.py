@@ -0,0 +1,253 @@
+import os, time, uuid, random, cProfile, threading
+from contextlib import contextmanager
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Dict, Callable, Iterator
+
+from transcript import JsonlWriter
+
+
+# Histogram buckets for span durations, in milliseconds
+DURATION_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Span:
+    """
+    One timed stage of a turn. Attributes carry counts (tokens, documents,
+    bytes) and are exported with the timing.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **counts):
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def to_dict(self) -> Dict:
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class Tracer:
+    """
+    Nested timing spans per thread, exported to any registered exporters and
+    aggregated into Prometheus-style duration histograms and attribute totals.
+    A sampled fraction of turns can be run under cProfile; profiles of turns
+    slower than `slow_turn_ms` are written to `profile_dir`.
+    """
+
+    def __init__(self, profile_sample_rate: float = 0.0, slow_turn_ms: float = 0.0, profile_dir: str = "profiles"):
+        self.profile_sample_rate = profile_sample_rate
+        self.slow_turn_ms = slow_turn_ms
+        self.profile_dir = profile_dir
+        self.exporters: List[Callable[[Dict], None]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(DURATION_BUCKETS_MS) + 1))
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._attr_totals: Dict[tuple, float] = defaultdict(float)
+        self._gauges: Dict[str, Callable[[], Dict]] = {}
+
+    def add_exporter(self, exporter: Callable[[Dict], None]):
+        self.exporters.append(exporter)
+
+    def add_gauge(self, name: str, read: Callable[[], Dict]):
+        """
+        Export the numeric values of `read()` as `bahria_<name>{stat="..."}`
+        gauges, read on every scrape.
+        """
+        self._gauges[name] = read
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attrs) -> Iterator[Span]:
+        """
+        Time a stage as a child of the current span, or of `parent` for work
+        handed to another thread.
+        """
+        stack = self._stack()
+        parent = parent or (stack[-1] if stack else None)
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attrs)
+        stack.append(span)
+        try:
+            yield span
+        except GeneratorExit:
+            # A streamed reply closed early by its consumer is not an error
+            span.set(closed=True)
+            raise
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = round((time.perf_counter() - span._start) * 1000, 3)
+            if span in stack:
+                stack.remove(span)
+            self._finish(span)
+
+    @contextmanager
+    def turn(self, **attrs) -> Iterator[Span]:
+        """
+        Root span for one user turn, profiled when sampled.
+        """
+        profiler = None
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active in this process
+                profiler = None
+        try:
+            with self.span("turn", **attrs) as span:
+                yield span
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                if span.duration_ms is not None and span.duration_ms >= self.slow_turn_ms:
+                    os.makedirs(self.profile_dir, exist_ok=True)
+                    path = os.path.join(self.profile_dir, f"turn-{span.trace_id}.prof")
+                    profiler.dump_stats(path)
+                    print(f"[Info] Slow turn ({span.duration_ms} ms) profile written to {path}")
+
+    def traced_generator(self, generator: Iterator, name: str = "turn", **attrs) -> Iterator:
+        """
+        Run a generator inside a span (a profiled turn for name="turn"), so
+        streamed work is timed until the last chunk is consumed.
+        """
+        context = self.turn(**attrs) if name == "turn" else self.span(name, **attrs)
+        with context:
+            yield from generator
+
+    def _finish(self, span: Span):
+        with self._lock:
+            bucket = next((i for i, bound in enumerate(DURATION_BUCKETS_MS) if span.duration_ms <= bound), len(DURATION_BUCKETS_MS))
+            self._histograms[span.name][bucket] += 1
+            self._sums[span.name] += span.duration_ms
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._attr_totals[(span.name, key)] += value
+        record = span.to_dict()
+        for exporter in self.exporters:
+            try:
+                exporter(record)
+            except Exception as e:
+                print(f"[Info] Span exporter failed: {str(e)}")
+
+    def render_prometheus(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# TYPE bahria_span_duration_ms histogram",
+        ]
+        with self._lock:
+            for name, counts in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS_MS + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f'bahria_span_duration_ms_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'bahria_span_duration_ms_sum{{span="{name}"}} {self._sums[name]}')
+                lines.append(f'bahria_span_duration_ms_count{{span="{name}"}} {cumulative}')
+            lines.append("# TYPE bahria_span_attr_total counter")
+            for (name, key), total in sorted(self._attr_totals.items()):
+                lines.append(f'bahria_span_attr_total{{span="{name}",attr="{key}"}} {total}')
+        for name, read in sorted(self._gauges.items()):
+            try:
+                values = read()
+            except Exception as e:
+                print(f"[Info] Gauge {name} failed: {str(e)}")
+                continue
+            lines.append(f"# TYPE bahria_{name} gauge")
+            for stat, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'bahria_{name}{{stat="{stat}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serve `render_prometheus()` at /metrics from a daemon thread.
+        """
+        tracer = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+tracer = Tracer(
+    profile_sample_rate=float(os.getenv("BAHRIA_PROFILE_SAMPLE_RATE", "0")),
+    slow_turn_ms=float(os.getenv("BAHRIA_PROFILE_SLOW_MS", "10000")),
+    profile_dir=os.getenv("BAHRIA_PROFILE_DIR", "profiles"),
+)
+
+if os.getenv("BAHRIA_TRACE_FILE"):
+    _trace_writer = JsonlWriter(
+        path=os.getenv("BAHRIA_TRACE_FILE"),
+        max_bytes=int(os.getenv("BAHRIA_TRACE_MAX_BYTES", str(50 * 1024 * 1024))),
+        backups=int(os.getenv("BAHRIA_TRACE_BACKUPS", "3")),
+    )
+    tracer.add_exporter(lambda record: _trace_writer.append([record]))
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def ensure_metrics_server():
+    """
+    Start the /metrics endpoint once per process if BAHRIA_METRICS_PORT is set,
+    on BAHRIA_METRICS_HOST (default 127.0.0.1, so only local scrapers reach it).
+    Streamlit re-runs scripts, so this is called on every run and is a no-op
+    after the first.
+    """
+    global _metrics_server
+    port = os.getenv("BAHRIA_METRICS_PORT")
+    if not port or _metrics_server is not None:
+        return
+    with _metrics_lock:
+        if _metrics_server is None:
+            _metrics_server = tracer.start_metrics_server(int(port), os.getenv("BAHRIA_METRICS_HOST", "127.0.0.1"))
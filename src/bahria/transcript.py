@@ -0,0 +1,116 @@
+import os, json, time, queue, atexit, threading
+from datetime import datetime, timezone
+from typing import Optional, List, Dict
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSONL file from a background thread.
+    `append()` only enqueues, so no file I/O happens on the request thread;
+    the writer drains the queue in batches, rotates the file once it grows
+    past `max_bytes` (keeping `backups` old files) and flushes at exit.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, path: str, max_bytes: int, backups: int, batch_size: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def append(self, records: List[Dict]):
+        """
+        Queue records, one JSON line each.
+        """
+        if self._closed:
+            return
+        self._ensure_started()
+        for record in records:
+            self._queue.put(record)
+
+    def flush(self):
+        """
+        Block until everything queued so far is on disk.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(self._CLOSE)
+            self._thread.join(timeout=10)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"jsonl-writer:{os.path.basename(self.path)}", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Gather whatever else arrives shortly after, up to a batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not self._CLOSE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            records = [item for item in batch if item is not self._CLOSE]
+            try:
+                if records:
+                    self._append(records)
+            except OSError as e:
+                print(f"[Info] Could not write {self.path}: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is self._CLOSE:
+                return
+
+    def _append(self, records: List[Dict]):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class TranscriptWriter(JsonlWriter):
+    """
+    Chat transcript: one line per message, tagged with time and session.
+    """
+
+    def write(self, session_id: str, messages: List[Dict]):
+        timestamp = datetime.now(timezone.utc).isoformat()
+        self.append([{"ts": timestamp, "session_id": session_id, **message} for message in messages])
+
+
+transcript = TranscriptWriter(
+    path=os.getenv("CHAT_TRANSCRIPT_PATH", "chat_history.jsonl"),
+    max_bytes=int(os.getenv("CHAT_TRANSCRIPT_MAX_BYTES", str(10 * 1024 * 1024))),
+    backups=int(os.getenv("CHAT_TRANSCRIPT_BACKUPS", "5")),
+)
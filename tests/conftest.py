@@ -0,0 +1,58 @@
+"""
+Offline test setup: the app modules from `src/bahria`, mongomock with the
+`$unionWith` support and fakes from `benchmarks/`, and synthetic listings.
+"""
+import os, sys, tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src", "bahria"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Read by the app modules at import time
+os.environ.update({
+    "OPENAI_API_KEY": "test",
+    "OPENAI_MODEL": "test-model",
+    "CREWAI_DISABLE_TELEMETRY": "true",
+    "CREWAI_TRACING_ENABLED": "false",
+    "CREWAI_TESTING": "true",
+    "DB_NAME": "bahria_test",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    # Off by default without change-stream invalidation, on for the tests
+    "MONGO_CACHE_TTL_SECONDS": "300",
+    # Never the repo's chat_history.jsonl, even for writes queued late
+    "CHAT_TRANSCRIPT_PATH": os.path.join(tempfile.mkdtemp(prefix="bahria-tests-"), "chat_history.jsonl"),
+})
+
+import mongomock, pymongo  # noqa: E402
+
+pymongo.MongoClient = mongomock.MongoClient
+
+import fakes  # noqa: E402
+
+fakes.enable_union_with()
+
+LISTINGS_PER_COLLECTION = 60
+
+
+@pytest.fixture(scope="session")
+def db():
+    from tools.mongo_client import get_db
+    from synthetic import seed
+
+    database = get_db()
+    seed(database, LISTINGS_PER_COLLECTION)
+    return database
+
+
+@pytest.fixture
+def fake_openai(monkeypatch, tmp_path):
+    import crew, transcript
+
+    monkeypatch.setattr(transcript.transcript, "path", str(tmp_path / "chat_history.jsonl"))
+    monkeypatch.setattr(fakes.FakeOpenAI, "completions", fakes.FakeCompletions(0, 0, 10))
+    monkeypatch.setattr(crew, "OpenAI", fakes.FakeOpenAI)
+    crew.openai_client.cache_clear()
+    yield fakes.FakeOpenAI.completions
+    crew.openai_client.cache_clear()
@@ -0,0 +1,48 @@
+import pytest
+
+from tools.index_advisor import bootstrap, rewrite_match, rewrite_pipeline
+from tools.mongo_tool import MongoTool
+
+COLLECTION = "index_advisor_test"
+
+
+@pytest.fixture
+def listings(db):
+    col = db[COLLECTION]
+    col.drop()
+    col.insert_many([
+        {"city": "Lahore", "society": "Bahria Town", "title": "bootstrapped"},
+        {"city": "Karachi", "society": "DHA", "title": "other city"},
+    ])
+    bootstrap(db, [COLLECTION])
+    # Inserted after bootstrap, so it has no normalized fields
+    col.insert_one({"city": "Lahore", "society": "BAHRIA TOWN Phase 8", "title": "new"})
+    yield col
+    col.drop()
+
+
+MATCH = {"city": "Lahore", "society": {"$regex": "bahria town", "$options": "i"}}
+
+
+def test_rewrite_without_fallback_misses_documents_inserted_after_bootstrap(listings):
+    assert [doc["title"] for doc in listings.find(rewrite_match(MATCH))] == ["bootstrapped"]
+
+
+def test_fallback_matches_documents_without_normalized_fields(listings):
+    rewritten = rewrite_match(MATCH, fallback=True)
+    assert rewritten["$or"][0] == {"society_norm": {"$regex": "bahria town"}}
+    assert sorted(doc["title"] for doc in listings.find(rewritten)) == ["bootstrapped", "new"]
+
+
+def test_fallback_combines_several_fields_with_and(listings):
+    match = {"city": {"$regex": "^lahore$", "$options": "i"}, **{k: v for k, v in MATCH.items() if k != "city"}}
+    rewritten = rewrite_match(match, fallback=True)
+    assert len(rewritten["$and"]) == 2
+    assert sorted(doc["title"] for doc in listings.find(rewritten)) == ["bootstrapped", "new"]
+
+
+def test_mongo_tool_uses_the_fallback(listings):
+    tool = MongoTool(use_cache=False, use_normalized_fields=True, project_summary_fields=False)
+    collection, _, pipeline = tool._optimize(COLLECTION, None, [{"$match": MATCH}])
+    assert pipeline == rewrite_pipeline([{"$match": MATCH}], fallback=True)
+    assert sorted(doc["title"] for doc in listings.aggregate(pipeline)) == ["bootstrapped", "new"]
@@ -0,0 +1,31 @@
+from tools.listing_filter import extract_filters, filter_listings
+
+SHOPS = [
+    {"property_type": "Shop", "list_type": "Rent", "monthly_rent": 80000, "price": 25000000},
+    {"property_type": "Shop", "list_type": "Rent", "monthly_rent": 150000, "price": 90000},
+    {"property_type": "Shop", "list_type": "Rent", "price": 90000},
+    {"property_type": "Shop", "list_type": "Sale", "monthly_rent": 80000, "price": 25000000},
+]
+
+
+def test_rent_price_range_uses_monthly_rent():
+    filters = extract_filters("shop for rent under 1 lakh in Bahria Town Lahore")
+    assert filter_listings(SHOPS, filters) == [SHOPS[0], SHOPS[2]]
+
+
+def test_sale_price_range_uses_price():
+    filters = extract_filters("shop for sale under 3 crore in Bahria Town Lahore")
+    assert filter_listings(SHOPS, filters) == [SHOPS[3]]
+
+
+def test_unpaged_history_counts_the_listings_that_match(db, fake_openai, monkeypatch):
+    import crew
+
+    monkeypatch.setattr(crew, "SEARCH_PAGE_SIZE", 0)
+    flow = crew.RealEstateFlow(session_id="test-unpaged-digest")
+    flow.kickoff(inputs={"user_input": "I want a home for sale in Bahria Town Lahore", "prompt": "", "stream": False})
+
+    digest = flow.session.history.get(1)["digest"]
+    assert digest["total_properties"] == flow.session.total_properties > 0
+    assert set(digest["property_types"]) == {"Home"}
+    assert f"total_properties: {digest['total_properties']}" in flow.chater.state_message()["content"]
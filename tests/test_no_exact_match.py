@@ -0,0 +1,31 @@
+from summaries import NO_MATCH_REPLY, ALTERNATIVES_HEADER, NO_ALTERNATIVES
+
+QUERY = "I want a 9 bedroom home in Bahria Town Lahore"
+
+
+def _ask(flow, text):
+    return flow.kickoff(inputs={"user_input": text, "prompt": "", "stream": False})
+
+
+def test_no_exact_match_shows_no_listings_until_alternatives_are_asked_for(db, fake_openai):
+    import crew
+
+    flow = crew.RealEstateFlow(session_id="test-no-exact-match")
+    assert _ask(flow, QUERY) == NO_MATCH_REPLY
+
+    digest = flow.session.history.get(1)["digest"]
+    assert digest["no_exact_match"] and digest["total_properties"] == 0
+    assert 0 < digest["alternatives"] <= crew.MAX_ALTERNATIVES
+    assert "sample" not in digest and flow.session.total_properties == 0
+
+    reply = _ask(flow, "show me some alternatives")
+    assert reply.startswith(ALTERNATIVES_HEADER)
+    assert reply.count("Pin Location") == digest["alternatives"]
+
+
+def test_alternatives_need_a_search_without_exact_match(db, fake_openai):
+    import crew
+
+    flow = crew.RealEstateFlow(session_id="test-no-alternatives")
+    _ask(flow, "I want a home in DHA Karachi")
+    assert flow.show_alternatives(1, "show alternatives") == NO_ALTERNATIVES
@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from tools.mongo_tool import MongoTool, result_cache
+from tools.listings_view import LISTINGS_VIEW, _view_document
+from tools.query_compiler import compile_pipeline, PROPERTY_COLLECTIONS
+
+QUERY = "looking for property in Bahria Town Lahore"
+
+
+@pytest.fixture(scope="module")
+def listings_view(db):
+    # mongomock has no $merge, so build the view the way the watcher does
+    now = datetime.now(timezone.utc)
+    db[LISTINGS_VIEW].drop()
+    db[LISTINGS_VIEW].insert_many([_view_document(coll, doc, now) for coll in PROPERTY_COLLECTIONS for doc in db[coll].find()])
+    yield db[LISTINGS_VIEW]
+    db[LISTINGS_VIEW].drop()
+
+
+def _unpaged(pipeline):
+    return json.loads("".join(MongoTool(use_cache=False, max_documents=0).stream(pipeline=pipeline, collection_hint=PROPERTY_COLLECTIONS[0])))
+
+
+@pytest.mark.parametrize("options, collections", [
+    ({}, set(PROPERTY_COLLECTIONS[:1])),
+    ({"fan_out": True}, set(PROPERTY_COLLECTIONS)),
+    ({"use_listings_view": True}, {LISTINGS_VIEW}),
+], ids=["union", "fan_out", "view"])
+def test_fetch_page_pages_through_every_result(db, listings_view, options, collections):
+    pipeline = compile_pipeline(QUERY)
+    tool = MongoTool(use_cache=False, **options)
+    queried = set()
+    run_cursor = tool._iter_cursor_pages
+    object.__setattr__(tool, "_iter_cursor_pages", lambda coll, *args: queried.add(coll) or run_cursor(coll, *args))
+    expected = _unpaged(pipeline)
+    assert len(expected) > 10
+
+    seen, after, pages, more = [], None, 0, True
+    while more:
+        docs, more = tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], after=after, page_size=10)
+        ids = [doc["_id"] for doc in docs]
+        assert ids == sorted(ids)
+        assert after is None or ids[0] > after
+        seen += docs
+        after = ids[-1]
+        pages += 1
+        assert pages <= len(expected)
+
+    assert pages == -(-len(expected) // 10)
+    assert len({doc["_id"] for doc in seen}) == len(seen)
+    assert sorted(doc["pin_location"] for doc in seen) == sorted(doc["pin_location"] for doc in expected)
+    # Pages run on the view or as fan-out branches, not the full union
+    assert queried == collections
+
+
+def test_fetch_page_is_cached_per_page(db):
+    pipeline = compile_pipeline(QUERY)
+    tool = MongoTool()
+    result_cache.invalidate()
+    first, _ = tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], page_size=10)
+    second, _ = tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], after=first[-1]["_id"], page_size=10)
+
+    hits = result_cache.hits
+    assert tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], page_size=10)[0] == first
+    assert tool.fetch_page(pipeline, PROPERTY_COLLECTIONS[0], after=first[-1]["_id"], page_size=10)[0] == second
+    assert result_cache.hits == hits + 2
+
+
+def test_show_more_reaches_the_end_of_a_search(db, fake_openai):
+    import crew
+    from summaries import SHOW_MORE_HINT, NO_MORE_RESULTS
+
+    pipeline = compile_pipeline(QUERY)
+    expected = _unpaged(pipeline)
+    flow = crew.RealEstateFlow(session_id="test-show-more")
+
+    reply = flow.kickoff(inputs={"user_input": "I want a property in Bahria Town Lahore", "prompt": "", "stream": False})
+    turns = 1
+    digest = flow.session.history.get(1)["digest"]
+    assert "total_properties" not in digest
+    assert digest["shown_properties"] == crew.SEARCH_PAGE_SIZE and digest["more_available"]
+    assert "more available" in flow.chater.state_message()["content"]
+    while SHOW_MORE_HINT in reply:
+        reply = flow.kickoff(inputs={"user_input": "show more", "prompt": "", "stream": False})
+        turns += 1
+        assert turns <= len(expected)
+    assert NO_MORE_RESULTS not in reply
+
+    record = flow.session.history.get(1)
+    shown = json.loads(record["tool_output"])
+    assert turns == -(-len(expected) // crew.SEARCH_PAGE_SIZE)
+    assert sorted(doc["pin_location"] for doc in shown) == sorted(doc["pin_location"] for doc in expected)
+    assert "more_available" not in record["digest"]
+    assert record["digest"]["total_properties"] == flow.session.total_properties == len(expected)
+
+
+def test_show_more_does_not_continue_an_older_search(db, fake_openai):
+    import crew
+    from summaries import SHOW_MORE_HINT, NO_MORE_RESULTS
+
+    flow = crew.RealEstateFlow(session_id="test-show-more-latest")
+    reply = flow.kickoff(inputs={"user_input": "I want a property in Bahria Town Lahore", "prompt": "", "stream": False})
+    assert SHOW_MORE_HINT in reply
+    reply = flow.kickoff(inputs={"user_input": "I want a home in DHA Karachi", "prompt": "", "stream": False})
+    assert SHOW_MORE_HINT not in reply
+    details = flow.session.property_details
+
+    reply = flow.kickoff(inputs={"user_input": "show more", "prompt": "", "stream": False})
+    assert reply == NO_MORE_RESULTS
+    assert flow.session.property_details == details
+    assert flow.session.history.get(1)["continuation"] is not None
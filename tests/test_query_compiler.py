@@ -0,0 +1,24 @@
+import pytest
+
+from tools.query_compiler import extract_query_spec, compile_pipeline
+
+
+@pytest.mark.parametrize("query", [
+    "looking for a home in Bahria Paradise Karachi",
+    "plots in Bahria Sports City Karachi",
+    "apartment in Bahria Heights Rawalpindi",
+    {"city": "Karachi", "society": "Bahria Paradise"},
+])
+def test_unknown_bahria_societies_are_left_to_the_agent(query):
+    assert extract_query_spec(query) is None
+    assert compile_pipeline(query) is None
+
+
+@pytest.mark.parametrize("query", [
+    "house in bahria lahore",
+    "bahria phase 8 rawalpindi homes",
+    "plots in bahria, karachi",
+    {"city": "Karachi", "society": "Bahria"},
+])
+def test_bare_bahria_still_means_bahria_town(query):
+    assert extract_query_spec(query)["society"] == ["bahria town"]
@@ -0,0 +1,27 @@
+import pytest
+
+from tools.mongo_tool import result_cache
+from tools.query_guard import QueryRejected, query_guard
+
+
+def _reject(*args, **kwargs):
+    raise QueryRejected("Error: Query rejected: it would scan every document in homes.")
+
+
+@pytest.mark.parametrize("page_size", [10, 0])
+def test_rejected_search_is_too_broad_without_agent_fallback(db, fake_openai, monkeypatch, page_size):
+    import crew
+    from summaries import SEARCH_TOO_BROAD
+
+    monkeypatch.setattr(crew, "SEARCH_PAGE_SIZE", page_size)
+    # Cached results were explained when they were first fetched
+    result_cache.invalidate()
+    monkeypatch.setattr(query_guard, "explain", _reject)
+    monkeypatch.setattr(crew.RealEstateFlow, "fetch_with_agent", lambda *args: pytest.fail("fell back to the agent"))
+    flow = crew.RealEstateFlow(session_id=f"test-too-broad-{page_size}")
+
+    reply = flow.kickoff(inputs={"user_input": "I want a property in Bahria Town Lahore", "prompt": "", "stream": False})
+
+    assert reply == SEARCH_TOO_BROAD
+    assert len(flow.session.history) == 0
+    assert flow.session.messages[-1] == {"role": "assistant", "content": SEARCH_TOO_BROAD}
@@ -0,0 +1,18 @@
+import pytest
+
+from quick_replies import classify, OFF_TOPIC
+
+
+@pytest.mark.parametrize("message", [
+    "do you have something that would match my budget?",
+    "any 3 story building?",
+    "what is the news on possession dates?",
+])
+def test_property_follow_ups_are_not_off_topic(message):
+    assert classify(message) is None
+    assert classify(message, in_search=True) is None
+
+
+def test_off_topic_is_only_answered_locally_before_a_search():
+    assert classify("tell me a joke") == ("off_topic", OFF_TOPIC)
+    assert classify("tell me a joke", in_search=True) is None
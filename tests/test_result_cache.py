@@ -0,0 +1,43 @@
+from tools.mongo_tool import MongoTool, result_cache
+from tools.query_compiler import PROPERTY_COLLECTIONS
+from tracing import tracer
+
+FILTER = {"city": "Lahore"}
+
+
+def _find(**options):
+    return "".join(MongoTool(**options).stream(filter=FILTER, collection_hint=PROPERTY_COLLECTIONS[0]))
+
+
+def test_find_cache_key_includes_the_projection(db):
+    result_cache.invalidate()
+    projected = _find(project_summary_fields=True)
+    full = _find(project_summary_fields=False)
+    assert full != projected
+    assert _find(project_summary_fields=True) == projected
+    assert _find(project_summary_fields=False) == full
+
+
+def test_cache_stats_are_exported_as_gauges(db):
+    result_cache.invalidate()
+    _find()
+    _find()
+    metrics = tracer.render_prometheus()
+    assert "# TYPE bahria_result_cache gauge" in metrics
+    assert f'bahria_result_cache{{stat="hits"}} {result_cache.hits}' in metrics
+    assert f'bahria_result_cache{{stat="misses"}} {result_cache.misses}' in metrics
+
+
+def test_cache_turns_off_when_the_change_stream_stops():
+    from tools.mongo_tool import ResultCache
+
+    class _Standalone:
+        def watch(self, pipeline):
+            raise RuntimeError("The $changeStream stage is only supported on replica sets")
+
+    cache = ResultCache(ttl_seconds=300, max_bytes=1024, max_entry_bytes=1024)
+    cache.put("key", "[]", 0, cache.version)
+    cache.watch(_Standalone(), PROPERTY_COLLECTIONS)
+    cache._watcher.join(timeout=5)
+    assert not cache.enabled
+    assert cache.get("key") is None